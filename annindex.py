@@ -0,0 +1,100 @@
+import argparse
+import time
+
+import numpy as np
+
+
+# inverted-file (IVF) index over L2-normalized vectors answering max cosine similarity queries: vectors are
+# bucketed by a spherical k-means and a query only scans the n_probe buckets whose centroids are closest to it.
+# Small sets are searched exactly, so the index is a drop-in replacement for a brute-force max over a matrix.
+class IVFIndex:
+    def __init__(self, vectors, n_lists=None, n_probe=8, exact_threshold=4096, iterations=10, seed=0):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.n_probe = n_probe
+        self.exact = len(self.vectors) <= exact_threshold
+        self.centroids = None
+        self.offsets = None
+        self.sorted_vectors = None
+        if not self.exact:
+            if n_lists is None:
+                n_lists = int(4 * np.sqrt(len(self.vectors)))
+            self.train(n_lists, iterations, np.random.default_rng(seed))
+
+    def train(self, n_lists, iterations, rng):
+        sample = self.vectors
+        if len(sample) > 256 * n_lists:
+            sample = sample[rng.choice(len(sample), 256 * n_lists, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=n_lists)
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = IVFIndex.normalize(sums)
+        assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        self.centroids = centroids
+        self.sorted_vectors = self.vectors[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+
+    def max_similarity(self, queries, exact=False):
+        queries = IVFIndex.normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if len(queries) == 0 or len(self.vectors) == 0:
+            return np.full(len(queries), -1.0, dtype=np.float32)
+        if exact or self.exact:
+            return (queries @ self.vectors.T).max(axis=1)
+        n_probe = min(self.n_probe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+        res = np.empty(len(queries), dtype=np.float32)
+        for i, lists in enumerate(probes):
+            candidates = np.concatenate([np.arange(self.offsets[j], self.offsets[j + 1]) for j in lists])
+            res[i] = (self.sorted_vectors[candidates] @ queries[i]).max() if len(candidates) > 0 else -1.0
+        return res
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @staticmethod
+    def normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+
+# recall of the best match and per-query latency of the IVF search against the exact scan
+def benchmark(index, queries, tolerance=1e-5):
+    start = time.perf_counter()
+    exact = index.max_similarity(queries, exact=True)
+    exact_time = (time.perf_counter() - start) / len(queries)
+    start = time.perf_counter()
+    approx = index.max_similarity(queries)
+    approx_time = (time.perf_counter() - start) / len(queries)
+    recall = float(np.mean(approx >= exact - tolerance))
+    return {'size': len(index), 'recall': recall, 'exact_ms': exact_time * 1000, 'ivf_ms': approx_time * 1000,
+            'max_error': float(np.max(exact - approx))}
+
+
+def synthetic_lexicon(size, dim, clusters, rng):
+    centers = IVFIndex.normalize(rng.normal(size=(clusters, dim)).astype(np.float32))
+    labels = rng.integers(0, clusters, size)
+    return IVFIndex.normalize(centers[labels] + 0.5 / np.sqrt(dim) * rng.normal(size=(size, dim)).astype(np.float32))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='recall/latency benchmark of the verb prototype IVF index')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[4, 8, 16])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    print('SIZE\t\tN_PROBE\t\tRECALL\t\tEXACT_MS\tIVF_MS')
+    for size in args.sizes:
+        vectors = synthetic_lexicon(size + args.queries, args.dim, max(16, size // 100), rng)
+        for n_probe in args.n_probe:
+            index = IVFIndex(vectors[args.queries:], n_probe=n_probe, exact_threshold=0)
+            res = benchmark(index, vectors[:args.queries])
+            print('{0}\t\t{1}\t\t{2:.3f}\t\t{3:.3f}\t\t{4:.3f}'.format(size, n_probe, res['recall'], res['exact_ms'],
+                                                                    res['ivf_ms']))
@@ -0,0 +1,172 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+DATASET = 'data/datasets/GeoQuestion201.csv'
+CACHE = 'data/benchmark/predictions.sqlite'
+BASELINE = 'data/benchmark/baseline.json'
+
+STAGES = ['ner', 'refine_questions', 'constituency_parse', 'construct_tree', 'labelling', 'verb_encoding',
+          'dependency', 'fol', 'sparql', 'total']
+
+
+# runs every question through parse_question and collects the per-stage seconds of each run; model outputs come
+# from the prediction cache, so a recorded cache makes the run independent of the network and the model weights
+def run(questions, repeat=1, warmup=1):
+    import geoparser
+    for question in questions[:warmup]:
+        geoparser.parse_question(question)
+    samples = {stage: [] for stage in STAGES}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for question in questions:
+            timings = {}
+            question_start = time.perf_counter()
+            geoparser.parse_question(question, timings=timings)
+            timings['total'] = time.perf_counter() - question_start
+            for stage in STAGES:
+                samples[stage].append(timings.get(stage, 0.0))
+    elapsed = time.perf_counter() - start
+    return samples, len(questions) * repeat / elapsed
+
+
+def report(samples, throughput):
+    res = {'throughput': throughput, 'stages': {}}
+    for stage, values in samples.items():
+        ms = np.array(values) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        res['stages'][stage] = {'p50': p50, 'p95': p95, 'p99': p99, 'mean': float(ms.mean())}
+    return res
+
+
+def print_report(res, baseline=None):
+    print('STAGE\t\t\t\tP50_MS\t\tP95_MS\t\tP99_MS\t\tMEAN_MS\t\tBASE_P95')
+    for stage, measures in res['stages'].items():
+        base = '-'
+        if baseline is not None and stage in baseline['stages']:
+            base = '{0:.2f}'.format(baseline['stages'][stage]['p95'])
+        print('{0: <20}\t{1:.2f}\t\t{2:.2f}\t\t{3:.2f}\t\t{4:.2f}\t\t{5}'.format(
+            stage, measures['p50'], measures['p95'], measures['p99'], measures['mean'], base))
+    print('throughput: {0:.1f} questions/s'.format(res['throughput']))
+
+
+# a stage regresses when its p95 grows by more than tolerance (stages faster than min_ms are too noisy to judge),
+# the run regresses when the throughput drops by more than tolerance
+def regressions(res, baseline, tolerance=0.2, min_ms=1.0):
+    found = []
+    for stage, measures in baseline['stages'].items():
+        if stage not in res['stages'] or max(measures['p95'], res['stages'][stage]['p95']) < min_ms:
+            continue
+        if res['stages'][stage]['p95'] > measures['p95'] * (1 + tolerance):
+            found.append('{0} p95 {1:.2f}ms > baseline {2:.2f}ms'.format(stage, res['stages'][stage]['p95'],
+                                                                          measures['p95']))
+    if res['throughput'] < baseline['throughput'] * (1 - tolerance):
+        found.append('throughput {0:.1f}/s < baseline {1:.1f}/s'.format(res['throughput'], baseline['throughput']))
+    return found
+
+
+# entities of the lexicon NER backend scored against the AllenNLP backend as reference, with the NER latency of both
+def compare_ner(questions, backend='lexicon'):
+    from ner import NER, NERResult
+    extractors = {'place_names': NERResult.place_names, 'dates': NERResult.dates, 'events': NERResult.events}
+    previous = NER.backend
+    entities = {}
+    latency = {}
+    for name in ['allennlp', backend]:
+        NER.configure(name)
+        entities[name] = []
+        start = time.perf_counter()
+        for question in questions:
+            result = NER.recognize(question)
+            entities[name].append({k: extract(result) for k, extract in extractors.items()})
+        latency[name] = (time.perf_counter() - start) / len(questions) * 1000
+    NER.configure(previous)
+    res = {'latency_ms': latency, 'entities': {}}
+    for k in extractors.keys():
+        tp = fp = fn = 0
+        for reference, predicted in zip(entities['allennlp'], entities[backend]):
+            tp += len(set(reference[k]) & set(predicted[k]))
+            fp += len(set(predicted[k]) - set(reference[k]))
+            fn += len(set(reference[k]) - set(predicted[k]))
+        pr = tp / (tp + fp) * 100 if tp + fp > 0 else float('nan')
+        rc = tp / (tp + fn) * 100 if tp + fn > 0 else float('nan')
+        fs = 2 * pr * rc / (pr + rc) if pr + rc > 0 else float('nan')
+        res['entities'][k] = {'PR': pr, 'RC': rc, 'FS': fs, 'COUNT': tp + fn}
+    return res
+
+
+def print_ner_comparison(res, backend='lexicon'):
+    print('ENTITY			PR		RC		FS		COUNT')
+    for k, measures in res['entities'].items():
+        print('{0: <12}		{1:2.1f}		{2:2.1f}		{3:2.1f}		{4}'.format(k, measures['PR'], measures['RC'],
+                                                                         measures['FS'], measures['COUNT']))
+    print('NER latency: allennlp {0:.2f}ms/question, {1} {2:.2f}ms/question'.format(
+        res['latency_ms']['allennlp'], backend, res['latency_ms'][backend]))
+
+
+def load_questions(path, limit=None):
+    from geoparser import load_dataset
+    questions = [q for q in load_dataset(path) if q.strip() != '']
+    return questions[:limit] if limit else questions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='offline per-stage latency benchmark of the question parser')
+    parser.add_argument('mode', choices=['record', 'run', 'ner'],
+                        help='record: fill the prediction cache with the real models; run: replay it offline; '
+                             'ner: accuracy and latency of the lexicon NER backend against the recorded AllenNLP NER')
+    parser.add_argument('--dataset', default=DATASET)
+    parser.add_argument('--cache', default=CACHE, help='SQLite prediction cache holding the recorded outputs')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=None, help='only use the first questions of the dataset')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--min-ms', type=float, default=1.0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    from ner import Embedding, ModelRegistry
+    questions = load_questions(args.dataset, args.limit)
+    if args.mode == 'record':
+        # verbs are embedded by the standalone ELMo so its outputs are recorded as well, and so are the verb
+        # prototypes: a replay without precomputed prototype files builds them from the cache
+        ModelRegistry.configure(cache=args.cache, reuse_parser_elmo=False)
+        for lexicon in Embedding.lexicons.values():
+            Embedding.embed_words(Embedding.read_lexicon(lexicon))
+        run(questions, repeat=1, warmup=0)
+        print('recorded {0} questions into {1}: {2}'.format(len(questions), args.cache, ModelRegistry.cache.stats()))
+        sys.exit(0)
+
+    if not os.path.exists(args.cache):
+        sys.exit('no recorded predictions at {0}, run `python benchmark.py record` first'.format(args.cache))
+    ModelRegistry.configure(cache=args.cache, offline=True, reuse_parser_elmo=False)
+    if args.mode == 'ner':
+        print_ner_comparison(compare_ner(questions))
+        sys.exit(0)
+    samples, throughput = run(questions, repeat=args.repeat)
+    res = report(samples, throughput)
+    loaded = list(ModelRegistry.models.keys())
+    if len(loaded) > 0:
+        logging.warning('the cache missed and these models were loaded, timings include inference: {}'
+                        .format(loaded))
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as fbaseline:
+            baseline = json.load(fbaseline)
+    print_report(res, baseline)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as fbaseline:
+            json.dump(res, fbaseline, indent=2)
+        print('baseline written to {}'.format(args.baseline))
+    elif baseline is not None:
+        found = regressions(res, baseline, args.tolerance, args.min_ms)
+        for regression in found:
+            print('REGRESSION: ' + regression)
+        sys.exit(1 if len(found) > 0 else 0)
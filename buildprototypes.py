@@ -0,0 +1,14 @@
+import argparse
+
+from ner import Embedding, ModelRegistry
+
+# regenerate the verb prototype matrices whenever data/verb/*.txt changes
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='precompute ELMo prototypes for the verb lexicons')
+    parser.add_argument('lexicons', nargs='*', default=['data/verb/action_verb.txt', 'data/verb/stative_verb.txt'])
+    parser.add_argument('--model-dir', default=None, help='directory holding local copies of the ELMo files')
+    args = parser.parse_args()
+    if args.model_dir is not None:
+        ModelRegistry.configure(cache_dir=args.model_dir)
+    for lexicon in args.lexicons:
+        Embedding.build_prototypes(lexicon)
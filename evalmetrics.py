@@ -0,0 +1,153 @@
+import argparse
+import json
+
+import numpy as np
+
+SECTIONS = ['encoding', 'fol', 'geosparql']
+
+# question word codes and comparison operators are reported as one encoding class each
+KEY_MAPPING = {'1': 'Q-Word', '2': 'Q-Word', '3': 'Q-Word', '4': 'Q-Word', '5': 'Q-Word', '6': 'Q-Word',
+               '7': 'Q-Word', '8': 'Q-Word', '<': '<>', '<=': '<>', '>': '<>', '>=': '<>'}
+
+MEASURES = ['MAC_PR', 'MAC_RC', 'MAC_FS', 'MIC_PR', 'MIC_RC', 'MIC_FS']
+
+
+def to_int(string):
+    if isinstance(string, int):
+        return string
+    if string.strip() == '':
+        return 0
+    return int(string)
+
+
+def read_labels(path='evaluation/eval.json'):
+    with open(path, encoding='utf-8') as jsonfile:
+        return json.load(jsonfile)
+
+
+# the manually labelled TP/FP/FN records of eval.json as arrays: one row per (question, section, key) record,
+# with the question and the (section, category) each row belongs to, so every measure and every bootstrap
+# replicate is a weighted sum over the rows
+class EvaluationSet:
+    def __init__(self, labels, sections=SECTIONS, mapping=None):
+        if mapping is None:
+            mapping = {'encoding': KEY_MAPPING}
+        self.questions = list(labels.keys())
+        self.categories = []
+        category_ids = {}
+        counts = []
+        question_index = []
+        category_index = []
+        for q, question in enumerate(self.questions):
+            for section in sections:
+                for key, record in labels[question].get(section, {}).items():
+                    category = (section, mapping.get(section, {}).get(key, key))
+                    if category not in category_ids:
+                        category_ids[category] = len(self.categories)
+                        self.categories.append(category)
+                    counts.append([to_int(record['TP']), to_int(record['FP']), to_int(record['FN'])])
+                    question_index.append(q)
+                    category_index.append(category_ids[category])
+        self.counts = np.array(counts, dtype=np.float64).reshape(-1, 3)
+        self.question_index = np.array(question_index, dtype=np.int64)
+        self.category_index = np.array(category_index, dtype=np.int64)
+        self.membership = np.zeros((len(self.counts), len(self.categories)))
+        self.membership[np.arange(len(self.counts)), self.category_index] = 1
+
+    @staticmethod
+    def from_file(path='evaluation/eval.json', sections=SECTIONS, mapping=None):
+        return EvaluationSet(read_labels(path), sections, mapping)
+
+    # weights is (replicates, rows); returns every measure as a (replicates, categories) array in percent.
+    # Macro scores average the per-record precision (recall) over the records where it is defined, micro scores
+    # pool the counts, F-scores are the harmonic mean of the matching precision and recall
+    def scores(self, weights):
+        tp, fp, fn = self.counts.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            has_pr = (tp + fp) > 0
+            has_rc = (tp + fn) > 0
+            pr = np.where(has_pr, tp / np.where(has_pr, tp + fp, 1), 0)
+            rc = np.where(has_rc, tp / np.where(has_rc, tp + fn, 1), 0)
+            res = {'MAC_PR': (weights * pr) @ self.membership / ((weights * has_pr) @ self.membership) * 100,
+                   'MAC_RC': (weights * rc) @ self.membership / ((weights * has_rc) @ self.membership) * 100}
+            sum_tp = (weights * tp) @ self.membership
+            sum_fp = (weights * fp) @ self.membership
+            sum_fn = (weights * fn) @ self.membership
+            res['MIC_PR'] = sum_tp / (sum_tp + sum_fp) * 100
+            res['MIC_RC'] = sum_tp / (sum_tp + sum_fn) * 100
+            res['MAC_FS'] = 2 * res['MAC_PR'] * res['MAC_RC'] / (res['MAC_PR'] + res['MAC_RC'])
+            res['MIC_FS'] = 2 * res['MIC_PR'] * res['MIC_RC'] / (res['MIC_PR'] + res['MIC_RC'])
+        res['COUNT'] = (weights * (tp + fn)) @ self.membership
+        return res
+
+    def measures(self):
+        res = self.scores(np.ones((1, len(self.counts))))
+        return self.to_dict({k: v[0] for k, v in res.items()})
+
+    # questions are resampled with replacement (all records of a question move together); every replicate is one
+    # row of the weight matrix, so all replicates are scored by the same matrix products
+    def bootstrap(self, n=1000, alpha=0.05, seed=0, batch=250):
+        rng = np.random.default_rng(seed)
+        replicates = {k: [] for k in MEASURES}
+        for start in range(0, n, batch):
+            size = min(batch, n - start)
+            draws = rng.multinomial(len(self.questions), np.full(len(self.questions), 1 / len(self.questions)),
+                                    size=size)
+            res = self.scores(draws[:, self.question_index].astype(np.float64))
+            for k in MEASURES:
+                replicates[k].append(res[k])
+        bounds = {}
+        for k in MEASURES:
+            values = np.concatenate(replicates[k])
+            with np.errstate(all='ignore'):
+                bounds[k] = np.nanpercentile(values, [alpha / 2 * 100, (1 - alpha / 2) * 100], axis=0).T
+        return self.to_dict(bounds)
+
+    def to_dict(self, arrays):
+        res = {section: {} for section in dict.fromkeys(c[0] for c in self.categories)}
+        for i, (section, key) in enumerate(self.categories):
+            res[section][key] = {k: arrays[k][i].tolist() for k in arrays.keys()}
+        return res
+
+
+def print_measures(measures, intervals=None, only_precision=False):
+    if not only_precision:
+        print('KEY\t\t\tMAC_PR\t\tMAC_RC\t\tMAC_FS\t\t\tMIC_PR\t\tMIC_RC\t\tMIC_FS\t\tCOUNT')
+    else:
+        print('KEY\t\t\tMAC_PR\t\t\tMIC_PR')
+    for key, val_dict in measures.items():
+        if not only_precision:
+            print('{0: >12}\t{1:2.1f}\t\t{2:2.1f}\t\t{3:2.1f}\t\t\t{4:2.1f}\t\t{5:2.1f}\t\t{6:2.1f}\t\t{7}'.
+                  format(key, val_dict['MAC_PR'], val_dict['MAC_RC'], val_dict['MAC_FS'], val_dict['MIC_PR'],
+                         val_dict['MIC_RC'], val_dict['MIC_FS'], int(val_dict['COUNT'])))
+        else:
+            print('{0: >12}\t{1:2.1f}\t\t\t{2:2.1f}'.format(key, val_dict['MAC_PR'], val_dict['MIC_PR']))
+        if intervals is not None:
+            bounds = intervals[key]
+            measures_shown = ['MAC_PR', 'MIC_PR'] if only_precision else MEASURES
+            print('{0: >12}\t'.format('CI') + '\t\t'.join('{0:2.1f}-{1:2.1f}'.format(*bounds[k])
+                                                         for k in measures_shown))
+    print('---------------------------------------------------------------------------------------------------------\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='micro/macro precision, recall and F1 of labelled parser results')
+    parser.add_argument('labels', nargs='*', default=['evaluation/eval.json'],
+                        help='eval.json files, one per pipeline variant')
+    parser.add_argument('--bootstrap', type=int, default=0, help='bootstrap replicates for confidence intervals')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the measures as JSON instead of tables')
+    args = parser.parse_args()
+    for path in args.labels:
+        evaluation = EvaluationSet.from_file(path)
+        measures = evaluation.measures()
+        intervals = None
+        if args.bootstrap > 0:
+            intervals = evaluation.bootstrap(args.bootstrap, args.alpha, args.seed)
+        if args.json:
+            print(json.dumps({'labels': path, 'measures': measures, 'intervals': intervals}))
+            continue
+        print(path)
+        for section in measures.keys():
+            print_measures(measures[section], None if intervals is None else intervals[section])
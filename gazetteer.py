@@ -0,0 +1,239 @@
+import os
+import re
+
+COUNTRIES = 'data/gazetteer/countries.txt'
+
+# capitalized words that start questions or commands rather than names
+LEADING_WORDS = ['where', 'what', 'which', 'when', 'who', 'how', 'why', 'does', 'do', 'did', 'is', 'are', 'was',
+                 'were', 'can', 'could', 'in', 'through', 'at', 'on', 'from', 'to', 'list', 'show', 'find', 'name',
+                 'give', 'tell', 'the', 'a', 'an', 'there', 'near', 'between', 'within', 'has', 'have']
+# gazetteer names that are also everyday words ('show us', 'buy turkey'), never taken as toponyms
+COMMON_WORDS = ['us', 'turkey', 'chad', 'guinea', 'jersey', 'reunion', 'man', 'bar', 'nice', 'split', 'reading']
+# lowercase words allowed inside a capitalized name, e.g. Isle of Man, Elephant and Castle, Nelson's Column
+NAME_CONNECTORS = ['of', 'and', 'upon', 'on', 'de', 'la', 'del', 'the', "'s"]
+
+TOKEN_PATTERN = re.compile(r"'s\b|\d+(?:[.,]\d+)*|\w+(?:[-.]\w+)*|[^\w\s]")
+
+# the key marking the end of a phrase inside a trie node, tokens are never empty so it cannot clash
+END = ''
+
+
+# (token, start, end) with character offsets
+def tokenize(text):
+    return [(m.group(), m.start(), m.end()) for m in TOKEN_PATTERN.finditer(text)]
+
+
+# token spans (start, end) of capitalized names: runs of capitalized tokens, where a connector may join two of
+# them. Single letters such as the pronoun 'I' are not names, and as every sentence opens with a capital its first
+# word only starts a name when the next word is capitalized as well (New York, not Where or Paris)
+def name_spans(words):
+    spans = []
+    i = 0
+    while i < len(words):
+        if not is_name_word(words, i):
+            i += 1
+            continue
+        end = i + 1
+        while end < len(words):
+            if is_name_word(words, end):
+                end += 1
+            elif words[end] in NAME_CONNECTORS and end + 1 < len(words) and is_name_word(words, end + 1):
+                end += 2
+            else:
+                break
+        spans.append((i, end))
+        i = end
+    return spans
+
+
+def is_name_word(words, i):
+    if len(words[i]) < 2 or not words[i][:1].isupper():
+        return False
+    if i == 0:
+        return words[i].lower() not in LEADING_WORDS and len(words) > 1 and is_name_word(words, 1)
+    return True
+
+
+# token trie over lowercased phrases: match() walks the trie from every token and keeps the longest phrase, so a
+# question is tagged in one pass whose cost depends on its length and the longest phrase, not on the phrase count
+class PhraseMatcher:
+    def __init__(self, phrases=None):
+        self.root = {}
+        self.size = 0
+        self.depth = 0
+        for phrase in phrases or []:
+            self.add(phrase)
+
+    def add(self, phrase, value=True):
+        tokens = [token.lower() for token, _, _ in tokenize(phrase)]
+        if len(tokens) == 0:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if END not in node:
+            self.size += 1
+        node[END] = value
+        self.depth = max(self.depth, len(tokens))
+
+    def longest(self, words, start):
+        node = self.root
+        match = None
+        for i in range(start, min(len(words), start + self.depth)):
+            node = node.get(words[i].lower())
+            if node is None:
+                break
+            if END in node:
+                match = (start, i + 1, node[END])
+        return match
+
+    # leftmost-longest, non-overlapping (start, end, value) token spans
+    def match(self, words):
+        res = []
+        i = 0
+        while i < len(words):
+            found = self.longest(words, i)
+            if found is None:
+                i += 1
+            else:
+                res.append(found)
+                i = found[1]
+        return res
+
+    # the same matches as (start, end, value) character offsets into text
+    def find(self, text):
+        tokens = tokenize(text)
+        words = [token for token, _, _ in tokens]
+        return [(tokens[start][1], tokens[end - 1][2], value) for start, end, value in self.match(words)]
+
+    def __contains__(self, phrase):
+        words = [token for token, _, _ in tokenize(phrase)]
+        found = self.longest(words, 0)
+        return found is not None and found[1] == len(words)
+
+    def __len__(self):
+        return self.size
+
+
+# toponyms with a label (GPE by default) from one name per line files, optionally 'name<TAB>label'. The countries
+# list is always loaded, further gazetteers come from GEOPARSER_GAZETTEERS (paths separated like PATH) or add_file.
+# Names are matched ignoring case, but a hit must start with a capitalized token and an acronym alias ('usa' of
+# 'united states of america (usa)') must be written in capitals
+class Gazetteer:
+    instance = None
+
+    def __init__(self, paths=(), label='GPE'):
+        self.matcher = PhraseMatcher()
+        self.acronyms = set()
+        for path in paths:
+            self.add_file(path, label)
+
+    @staticmethod
+    def default():
+        if Gazetteer.instance is None:
+            paths = [COUNTRIES] + [p for p in os.environ.get('GEOPARSER_GAZETTEERS', '').split(os.pathsep) if p]
+            Gazetteer.instance = Gazetteer([p for p in paths if os.path.exists(p)])
+        return Gazetteer.instance
+
+    def add(self, name, label='GPE'):
+        self.matcher.add(name, label)
+
+    def add_file(self, path, label='GPE'):
+        with open(path, encoding='utf-8') as fgazetteer:
+            for line in fgazetteer:
+                parts = line.rstrip('\n').split('\t')
+                alias = Gazetteer.alias(parts[0])
+                if alias is not None and alias.isalpha() and len(alias) <= 4:
+                    self.acronyms.add(alias.lower())
+                for name in Gazetteer.variants(parts[0]):
+                    self.add(name, parts[1].strip() if len(parts) > 1 else label)
+
+    @staticmethod
+    def alias(name):
+        alias = re.search(r'\((.*)\)', name)
+        return alias.group(1).strip() if alias is not None else None
+
+    # 'korea, republic of (south korea)' is known as 'korea, republic of', 'republic of korea', 'korea' and
+    # 'south korea'. Variants of one or two letters ('us', 'uk') and everyday words are left out
+    @staticmethod
+    def variants(name):
+        names = []
+        alias = re.search(r'\((.*)\)', name)
+        if alias is not None:
+            names.append(alias.group(1).strip())
+            name = name[:alias.start()]
+        name = name.strip()
+        if name != '':
+            names.append(name)
+        if ',' in name:
+            head, tail = name.split(',', 1)
+            names.extend([tail.strip() + ' ' + head.strip(), head.strip()])
+        return [n for n in names if len(n) > 2 and n.lower() not in COMMON_WORDS]
+
+    def match(self, words):
+        return [(start, end, label) for start, end, label in self.matcher.match(words)
+                if self.is_cased(words[start: end])]
+
+    def is_cased(self, words):
+        if not words[0][:1].isupper():
+            return False
+        return len(words) > 1 or words[0].lower() not in self.acronyms or words[0].isupper()
+
+    def find(self, text):
+        tokens = tokenize(text)
+        words = [token for token, _, _ in tokens]
+        return [(tokens[start][1], tokens[end - 1][2], label) for start, end, label in self.match(words)]
+
+    # True if every capitalized name in the tagged words is tagged as a place (one of place_tags) or a known toponym,
+    # then a second NER pass has no place name left to find
+    def covers(self, words, tags, place_tags):
+        known = [tag in place_tags for tag in tags]
+        for start, end, _ in self.match(words):
+            for i in range(start, end):
+                known[i] = True
+        return all(known[i] for start, end in name_spans(words) for i in range(start, end) if words[i][:1].isupper())
+
+    def __len__(self):
+        return len(self.matcher)
+
+
+# place or event types of a question: the longest non-overlapping mentions of a type vocabulary on word boundaries,
+# outside the excluded strings (names found by NER), plus the compounds a type forms with one of the names:
+# 'type X', 'X type' and, for singular types, 'the type of X'
+class TypeMatcher:
+    def __init__(self, types):
+        self.matcher = PhraseMatcher(types)
+
+    # (start, end, text) character spans into question, longest first
+    def find(self, question, excluded=(), specifics=()):
+        # excluded text is blanked with a symbol, which also keeps the words around it from becoming adjacent
+        masked = list(question)
+        for ex in excluded:
+            if ex not in question:
+                ex = ex.replace(" 's", "'s")
+            start = question.find(ex) if ex != '' else -1
+            while start >= 0:
+                masked[start: start + len(ex)] = '\0' * len(ex)
+                start = question.find(ex, start + len(ex))
+        res = []
+        for start, end, _ in self.matcher.find(''.join(masked)):
+            text = question[start: end]
+            res.append((start, end, text))
+            # types match in any case, but compounds with a specific only when the type is written in lowercase, so
+            # a capitalized type stays part of a name, e.g. 'the Castle of Edinburgh' is not 'the castle of ...'
+            if text != text.lower():
+                continue
+            for specific in specifics:
+                if question.startswith(' ' + specific, end):
+                    res.append((start, end + 1 + len(specific), question[start: end + 1 + len(specific)]))
+                elif question.endswith(specific + ' ', 0, start):
+                    res.append((start - 1 - len(specific), end, question[start - 1 - len(specific): end]))
+                elif not text.endswith('s') and question.startswith(' of ' + specific, end):
+                    if text.startswith('the '):
+                        res.append((start, end + 4 + len(specific), question[start: end + 4 + len(specific)]))
+                    elif question.endswith('the ', 0, start):
+                        res.append((start - 4, end + 4 + len(specific), question[start - 4: end + 4 + len(specific)]))
+        return sorted(res, key=lambda match: match[1] - match[0], reverse=True)
+
+    def __len__(self):
+        return len(self.matcher)
@@ -1,9 +1,19 @@
-from ner import NER, CPARSER, Embedding, DPARSER
+from ner import NER, CPARSER, Embedding, DPARSER, ModelRegistry
 from placequestionparsetree import FOLGenerator
 from querygenerator import SPARQLGenerator
+from evalmetrics import EvaluationSet, print_measures
+from gazetteer import TypeMatcher
+from spans import Label, LabelSet, SpanAllocator, occurrences
 import re
 import json
 import logging
+import multiprocessing
+import argparse
+import collections
+import itertools
+import os
+import sys
+import time
 
 logging.basicConfig(level=logging.INFO)
 
@@ -48,6 +58,26 @@ def load_dataset(path):
     return questions
 
 
+# read questions lazily, one per non-empty line ('-' reads stdin)
+def iter_dataset(path):
+    fdataset = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8-sig')
+    try:
+        for line in fdataset:
+            if line.strip() != '':
+                yield line
+    finally:
+        if fdataset is not sys.stdin:
+            fdataset.close()
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while len(chunk) > 0:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
 def load_dummy_dataset():
     questions = []
     questions.extend(["Is county Oxfordshire east of the county Essex?",
@@ -62,40 +92,25 @@ def load_dummy_dataset():
 
 
 # find toponyms
-def find_toponyms(question):
-    return NER.extract_place_names(question)
+def find_toponyms(question, ner_result=None):
+    return NER.extract_place_names(ner_result or question)
 
 
 # find events
-def find_events(question):
-    return NER.extract_events(question)
+def find_events(question, ner_result=None):
+    return NER.extract_events(ner_result or question)
 
 
-# find place types and event types
+# find place types and event types, longest first; types is a TypeMatcher or a collection of type names
 def find_types(question, excluded, types, specifics=[]):
-    whole_question = question
-    for ex in excluded:
-        question = question.replace(ex, '')
-    question = question.lower().strip()
-    captured = []
-    for type in types:
-        if type in question:
-            captured.append(type)
-            for specific in specifics:
-                if type + ' ' + specific in whole_question:
-                    captured.append(type + ' ' + specific)
-                elif specific + ' ' + type in whole_question:
-                    captured.append(specific + ' ' + type)
-                elif not type.endswith(
-                        "s") and 'the ' + type + ' of ' + specific in whole_question:
-                    captured.append('the ' + type + ' of ' + specific)
-    captured = sorted(captured, key=len, reverse=True)
-    return captured
+    if not isinstance(types, TypeMatcher):
+        types = TypeMatcher(types)
+    return [text for _, _, text in types.find(question, excluded, specifics)]
 
 
 # find dates
-def find_dates(question):
-    return NER.extract_dates(question)
+def find_dates(question, ner_result=None):
+    return NER.extract_dates(ner_result or question)
 
 
 def find_compound_question_words(question):
@@ -114,10 +129,12 @@ def find_compound_question_words(question):
 
 
 # extract information
-def extract_information(question, ptypes, etypes):
-    toponyms = find_toponyms(question)
-    events = find_events(question)
-    dates = find_dates(question)
+def extract_information(question, ptypes, etypes, ner_result=None):
+    # fine-grained and coarse NER run once each, places, events and dates are decoded from the same tags
+    ner_result = NER.recognize(ner_result or question)
+    toponyms = find_toponyms(question, ner_result)
+    events = find_events(question, ner_result)
+    dates = find_dates(question, ner_result)
 
     excluded = []
     excluded.extend(toponyms)
@@ -152,10 +169,11 @@ def extract_information(question, ptypes, etypes):
     return results
 
 
+# labels for the NER results and types; earlier orders win, an occurrence inside an already labelled one is dropped
 def construct_cleaning_labels(results, question):
     orders = ['toponyms', 'events', 'dates', 'place_types', 'event_types']
-    indices = []
-    labelled = {}
+    allocator = SpanAllocator()
+    labelled = LabelSet()
     for order in orders:
         values = results[order]
         role = ENCODINGS[order]
@@ -163,39 +181,11 @@ def construct_cleaning_labels(results, question):
             temp = v
             if temp not in question:
                 temp = temp.replace(" 's", "'s")
-            matches = re.finditer(temp, question)
-            matches_positions = [[match.start(), match.end()] for match in matches]
-            for position in matches_positions:
-                if not is_overlap(position, indices):
-                    labelled[v + '--' + str(position[0])] = {'start': position[0],
-                                                             'end': position[1],
-                                                             'role': role,
-                                                             'pos': 'NOUN'}
-            indices.extend(matches_positions)
+            for start, end in allocator.claim(occurrences(question, temp)):
+                labelled.add(Label(v, start, end, role, 'NOUN'))
     return labelled
 
 
-def is_overlap(position, indices):
-    for index in indices:
-        if position[0] >= index[0] and position[1] <= index[1]:
-            return True
-    return False
-
-
-def clean_extracted_info(info):
-    clean_info = {}
-    for k1, v1 in info.items():
-        correct = True
-        for k2, v2 in info.items():
-            if k1 != k2:
-                if re.split('--', k1.strip())[0] in k2 and v1['start'] >= v2['start'] and v1['end'] <= v2['end']:
-                    correct = False
-                    break
-        if correct:
-            clean_info[k1] = v1
-    return clean_info
-
-
 # standardization of addresses and 's as containment
 def refine_questions(question, toponyms, types):
     for t in toponyms:
@@ -272,131 +262,259 @@ fet = 'data/event_type/event_types'
 
 pt_set, pt_dict = load_pt(fpt)
 et_set, et_dict = load_pt(fet)
+pt_matcher = TypeMatcher(pt_set)
+et_matcher = TypeMatcher(et_set)
 actv = load_word(factv)
 stav = load_word(fstav)
 countries = load_word(fcountries)
 
-Embedding.set_stative_active_words(stav, actv)
+Embedding.register_lexicons(fstav, factv)
 
 is_console = False  # WRITE THE CONSOLE INTO FILE IF TRUE
 is_test = False  # IF TRUE: ONLY READ DUMMY QUESTIONS AND RUN THE PROGRAM
 is_eval = True  # IF TURE: RUN EVALUATION PER QUESTION, ALSO WRITE THE RESULTS IN EVAL.JSON
 
-logging.info('running parameters: test: {0}, console: {1}, eval: {2}'.format(str(is_test), str(is_console),
-                                                                             str(is_eval)))
-logging.info('reading dataset...')
-if not is_test:
-    questions = load_dataset('data/datasets/GeoQuestion201.csv')
-else:
-    questions = load_dummy_dataset()  # if you want to just test to check the function...
-
-eval = {}
-if is_eval:
-    eval = read_labels()  # question: encoding: {elem: {TP: , FP:, FN: }},
-    #                                 fol: {elem: {TP: , FP:, FN: }},
-    #                                 geosparql: {elem: {TP: , FP:, FN: }}
-    eval_fol = ['Declaration', 'Intent', 'SRelation', 'Situation', 'Comparison', 'Quality', 'Conjunction']
-    eval_geosparql = ['Overall', 'Intent', 'Where', 'OrderBy', 'GroupBy']
+eval = {}  # question: encoding: {elem: {TP: , FP:, FN: }},
+#            fol: {elem: {TP: , FP:, FN: }},
+#            geosparql: {elem: {TP: , FP:, FN: }}
+eval_fol = ['Declaration', 'Intent', 'SRelation', 'Situation', 'Comparison', 'Quality', 'Conjunction']
+eval_geosparql = ['Overall', 'Intent', 'Where', 'OrderBy', 'GroupBy']
+
+
+# wall-clock time per pipeline stage: every lap charges the time since the previous lap to the given stage
+class StageClock:
+    def __init__(self, timings=None):
+        self.timings = timings
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        if self.timings is not None:
+            self.timings[stage] = self.timings.get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+# batched model stages: NER over the questions, then both parsers over the refined questions
+def prepare_questions(questions):
+    ner_results = NER.recognize_batch(questions)
+    results = []
+    refined = []
+    for question, ner_result in zip(questions, ner_results):
+        result = extract_information(question, pt_matcher, et_matcher, ner_result=ner_result)
+        results.append(result)
+        refined.append(refine_questions(question, result['toponyms'], result['place_types']))
+    c_embeddings = [None] * len(refined)
+    c_parses = CPARSER.parse_batch(refined, embeddings=c_embeddings)
+    d_parses = DPARSER.parse_batch(refined)
+    return list(zip(results, c_parses, d_parses, c_embeddings))
+
+
+def parse_question(question, result=None, c_parse=None, d_parse=None, c_embeddings=None, timings=None):
+    clock = StageClock(timings)
+    original_question = question
+    console = '*********************************************\n'
+    # extract NER using fine-grained NER model
+    if result is None:
+        result = extract_information(question, pt_matcher, et_matcher)
+    logging.info('NER extracts: \n' + str(result))
+    clock.lap('ner')
+    question = refine_questions(question, result['toponyms'], result['place_types'])
+    clock.lap('refine_questions')
+
+    # construct and constituency tree dependency tree
+    if c_parse is None:
+        c_embeddings = [None]
+        c_parse = CPARSER.parse_batch([question], embeddings=c_embeddings)[0]
+        c_embeddings = c_embeddings[0]
+    clock.lap('constituency_parse')
+    tree = CPARSER.construct_tree(question, parse_results=c_parse)
+    clock.lap('construct_tree')
+
+    logging.debug('initial constituency tree:\n' + str(tree))
+    labelled = LabelSet()
+    for k, v in PRONOUN.items():
+        if question.startswith(k + ' '):
+            tree.label_role(k, v, question_words=True)
+            labelled.add(Label(k, question.index(k), question.index(k) + len(k), v, 'ADV'))
+    compound_qw = find_compound_question_words(question)
+    for qw in compound_qw.keys():
+        role = ''
+        if re.split('--', qw.strip())[0] in COMPOUNDS_QW_ROLE.keys():
+            role = COMPOUNDS_QW_ROLE[re.split('--', qw.strip())[0]]
+        tree.label_role(re.split('--', qw.strip())[0], role, clean=True, question_words=True)
+    labelled.update(compound_qw)
+
+    ners = construct_cleaning_labels(result, question)
+    logging.info('clean ners:\n' + str(ners))
+    console += str(ners) + '\n'
+
+    for label in ners:
+        tree.label_role(label.text, label.role, clean=True)
+
+    labelled.update(ners)
+    labelled.update(tree.label_tree())
+
+    verbs = tree.get_verbs()
+    clock.lap('labelling')
+    # token embeddings captured from the constituency parser's ELMo (if enabled) are aligned with the parser's
+    # tokens, which the unlabelled root of the parse still holds
+    if c_embeddings is not None:
+        decisions = Embedding.verb_encoding(c_parse['word'], verbs, embeddings=c_embeddings)
+    else:
+        decisions = Embedding.verb_encoding(tree.root.name, verbs)
+    clock.lap('verb_encoding')
+    labelled.update(tree.label_situation_activities(verbs=verbs, decisions=decisions))
+    tree.label_events_actions()
+    labelled.update(tree.label_qualities())
+    tree.clean_phrases()
+    tree.clean_tree()
+
+    labelled.update(tree.label_spatiotemporal_relationships())
+
+    for c, v in COMPARISON.items():
+        if c in question:
+            tree.label_role(c, v, comparison=True)
+            labelled.add(Label(c, question.index(c), question.index(c) + len(c), v, 'ADJ'))
+    for creg, c in COMPARISON_REGEX.items():
+        reg_search = re.search(creg, question)
+        if reg_search is not None:
+            tree.label_complex_comparison(reg_search, c, COMPARISON[c])
+            labelled.add(Label(c, reg_search.regs[0][0], reg_search.regs[0][1], COMPARISON[c], 'ADJ'))
+
+    tree.label_events_actions()
+    tree.clean_phrases()
+    logging.info('constituency tree:\n' + str(tree))
+    labelled = labelled.clean()
+    logging.info('encoded elements:\n' + str(labelled))
+    console += str(tree) + '\n'
+    clock.lap('labelling')
+
+    # construct dependency tree, cleaning
+    d_tree = DPARSER.construct_tree(question, parse_results=d_parse)
+    logging.debug('initial dependency tree:\n' + str(d_tree))
+
+    d_tree.clean_d_tree(labelled)
+    logging.info('refined dependency tree:\n' + str(d_tree))
+    console += str(d_tree) + '\n'
+    clock.lap('dependency')
+
+    # use FOLGenerator to detect dependencies inside both parsing trees
+    # intent recognition
+    # generate FOL statements based on deps (FOLGenerator class)
+    fol = FOLGenerator(cons_tree=tree, dep_tree=d_tree)
+    fol.generate_dependencies()
+
+    dep_strings = fol.format_dependencies()
+    console += dep_strings + '\n'
+
+    # print FOL statements
+    log_string = fol.format_logical_form()
+    console += log_string + '\n'
+    clock.lap('fol')
+
+    # generate GeoSPARQL queries from FOL statements (deps)
+    generator = SPARQLGenerator(fol.dependencies, fol.variables)
+    geosparql = generator.to_SPARQL()
+    logging.info('GeoSPARQL:\n' + geosparql)
+    console += geosparql + '\n\n\n'
+    clock.lap('sparql')
+    return {'original_question': original_question, 'question': question, 'ner': result, 'tree': tree,
+            'labelled': labelled, 'd_tree': d_tree, 'fol': fol, 'dependencies': dep_strings,
+            'logical_form': log_string, 'geosparql': geosparql, 'console': console}
+
+
+# run the model stages in batches of chunk_size questions and yield the parsed questions in order
+def analyze_batch(questions, chunk_size=256):
+    for chunk in iter_chunks(questions, chunk_size):
+        for question, (result, c_parse, d_parse, c_embeddings) in zip(chunk, prepare_questions(chunk)):
+            yield parse_question(question, result=result, c_parse=c_parse, d_parse=d_parse,
+                                 c_embeddings=c_embeddings)
+
+
+# json-friendly view of a parsed question
+def summarize(parsed):
+    return {'question': parsed['original_question'].strip(), 'refined': parsed['question'].strip(),
+            'ner': parsed['ner'], 'labelled': parsed['labelled'].to_dict(), 'encodings': parsed['tree'].all_encodings(),
+            'constituency': str(parsed['tree']), 'dependency': str(parsed['d_tree']),
+            'dependencies': parsed['dependencies'], 'fol': parsed['logical_form'], 'geosparql': parsed['geosparql']}
+
+
+def init_worker():
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+# the model stages of a chunk run together; if the chunk fails each question is retried alone so one bad
+# question only fails itself
+def analyze_chunk(chunk):
+    try:
+        parsed_questions = list(analyze_batch(chunk, chunk_size=len(chunk)))
+    except Exception:
+        logging.exception('chunk failed, parsing its questions one by one')
+        parsed_questions = []
+        for question in chunk:
+            try:
+                parsed_questions.append(parse_question(question))
+            except Exception as e:
+                parsed_questions.append({'original_question': question, 'error': repr(e)})
+    records = []
+    for parsed in parsed_questions:
+        if 'error' in parsed:
+            records.append({'question': parsed['original_question'].strip(), 'error': parsed['error']})
+            continue
+        if is_console:
+            append_to_file(parsed['console'])
+        records.append(summarize(parsed))
+    return records
+
+
+# models and lexicons are loaded before the pool forks, so every worker shares the weights copy-on-write;
+# each worker gets chunks of chunk_size questions (its model stages run batched) and results keep input order.
+# At most max_pending chunks are in flight, so the input is consumed only as fast as results are taken
+def analyze_parallel(questions, processes=None, chunk_size=16, max_pending=None):
+    ModelRegistry.preload()
+    Embedding.load_lexicons()
+    if max_pending is None:
+        max_pending = 2 * (processes or os.cpu_count())
+    with multiprocessing.get_context('fork').Pool(processes, initializer=init_worker) as pool:
+        pending = collections.deque()
+        for chunk in iter_chunks(questions, chunk_size):
+            pending.append(pool.apply_async(analyze_chunk, (chunk,)))
+            if len(pending) >= max_pending:
+                for record in pending.popleft().get():
+                    yield record
+        while len(pending) > 0:
+            for record in pending.popleft().get():
+                yield record
+
+
+# write one JSON record per line as soon as its chunk is parsed, so partial output is usable during the run
+def stream(questions, output, chunk_size=16, workers=0):
+    if workers > 0:
+        records = analyze_parallel(questions, processes=workers, chunk_size=chunk_size)
+    else:
+        records = (record for chunk in iter_chunks(questions, chunk_size) for record in analyze_chunk(chunk))
+    count = 0
+    for record in records:
+        output.write(json.dumps(record, ensure_ascii=False) + '\n')
+        output.flush()
+        count += 1
+    return count
 
 
 def analyze(questions):
     clean_file()
-    for question in questions:
-        original_question = question
-        console = '*********************************************\n'
-        # extract NER using fine-grained NER model
-        result = extract_information(question, pt_set, et_set)
-        logging.info('NER extracts: \n' + str(result))
-        question = refine_questions(question, result['toponyms'], result['place_types'])
-
-        # construct and constituency tree dependency tree
-        tree = CPARSER.construct_tree(question)
-
-        logging.debug('initial constituency tree:\n' + str(tree))
-        labelled = {}
-        for k, v in PRONOUN.items():
-            if question.startswith(k + ' '):
-                tree.label_role(k, v, question_words=True)
-                labelled[k + "--" + str(question.index(k))] = {'start': question.index(k),
-                                                               'end': question.index(k) + len(k), 'role': v,
-                                                               'pos': 'ADV'}
-        compound_qw = find_compound_question_words(question)
-        for qw in compound_qw.keys():
-            role = ''
-            if re.split('--', qw.strip())[0] in COMPOUNDS_QW_ROLE.keys():
-                role = COMPOUNDS_QW_ROLE[re.split('--', qw.strip())[0]]
-            tree.label_role(re.split('--', qw.strip())[0], role, clean=True, question_words=True)
-        labelled = {**labelled, **compound_qw}
-
-        ners = construct_cleaning_labels(result, question)
-        logging.info('clean ners:\n' + str(ners))
-        console += str(ners) + '\n'
-
-        for k, v in ners.items():
-            tree.label_role(re.split('--', k.strip())[0], v['role'], clean=True)
-
-        labelled = {**labelled, **ners}
-        labelled = {**labelled, **tree.label_tree()}
-
-        verbs = tree.get_verbs()
-        decisions = Embedding.verb_encoding(tree.root.name, verbs)
-        labelled = {**labelled, **tree.label_situation_activities(verbs=verbs, decisions=decisions)}
-        tree.label_events_actions()
-        labelled = {**labelled, **tree.label_qualities()}
-        tree.clean_phrases()
-        tree.clean_tree()
-
-        labelled = {**labelled, **tree.label_spatiotemporal_relationships()}
-
-        for c, v in COMPARISON.items():
-            if c in question:
-                tree.label_role(c, v, comparison=True)
-                labelled[c + '--' + str(question.index(c))] = {'start': question.index(c),
-                                                               'end': question.index(c) + len(c),
-                                                               'role': v, 'pos': 'ADJ'}
-        for creg, c in COMPARISON_REGEX.items():
-            reg_search = re.search(creg, question)
-            if reg_search is not None:
-                tree.label_complex_comparison(reg_search, c, COMPARISON[c])
-                labelled[c + '--' + str(reg_search.regs[0][0])] = {'start': reg_search.regs[0][0],
-                                                                   'end': reg_search.regs[0][1], 'role': COMPARISON[c],
-                                                                   'pos': 'ADJ'}
-
-        tree.label_events_actions()
-        tree.clean_phrases()
-        logging.info('constituency tree:\n' + str(tree))
-        labelled = clean_extracted_info(labelled)
-        logging.info('encoded elements:\n' + str(labelled))
-        console += str(tree) + '\n'
-
-        # construct dependency tree, cleaning
-        d_tree = DPARSER.construct_tree(question)
-        logging.debug('initial dependency tree:\n' + str(d_tree))
-
-        d_tree.clean_d_tree(labelled)
-        logging.info('refined dependency tree:\n' + str(d_tree))
-        console += str(d_tree) + '\n'
-
-        # use FOLGenerator to detect dependencies inside both parsing trees
-        # intent recognition
-        # generate FOL statements based on deps (FOLGenerator class)
-        fol = FOLGenerator(cons_tree=tree, dep_tree=d_tree)
-        fol.generate_dependencies()
-
-        dep_strings = fol.print_dependencies()
-        console += dep_strings + '\n'
-
-        # print FOL statements
-        log_string = fol.print_logical_form()
-        console += log_string + '\n'
-
-        # generate GeoSPARQL queries from FOL statements (deps)
-        generator = SPARQLGenerator(fol.dependencies, fol.variables)
-        geosparql = generator.to_SPARQL()
-        print(geosparql)
-        console += geosparql + '\n\n\n'
+    for parsed in analyze_batch(questions):
+        original_question = parsed['original_question']
+        question = parsed['question']
+        tree = parsed['tree']
+        log_string = parsed['logical_form']
+        geosparql = parsed['geosparql']
         if is_console:
-            append_to_file(console)
+            append_to_file(parsed['console'])
 
         if is_eval and question not in eval.keys():
             eval[question] = {'encoding': {}, 'fol': {}, 'geosparql': {}}
@@ -437,99 +555,47 @@ def analyze(questions):
     write_labels()
 
 
-analyze(questions)
-
-
-def add_measures(dict_question, dict_all):
-    TP = to_int(dict_question['TP'])
-    FP = to_int(dict_question['FP'])
-    FN = to_int(dict_question['FN'])
-    PR = 0
-    RC = 0
-    dict_all['TP'] += TP
-    dict_all['FP'] += FP
-    dict_all['FN'] += FN
-    dict_all['COUNT'] += 1
-    if TP + FP > 0:
-        PR = TP / (TP + FP)
-        dict_all['PR'] += PR
-        dict_all['COUNT_PR'] += 1
-
-    if TP + FN > 0:
-        RC = TP / (TP + FN)
-        dict_all['RC'] += RC
-        dict_all['COUNT_RC'] += 1
-    return dict_all
-
-
-KEY_MAPPING = {'1':'Q-Word','2':'Q-Word','3':'Q-Word','4':'Q-Word','5':'Q-Word','6':'Q-Word','7':'Q-Word','8':'Q-Word',
-               '<':'<>', '<=':'<>', '>':'<>', '>=':'<>'}
-
-
-def add_question_measures(eval_question, dict_all, mapping=False):
-    for key, val_dict in eval_question.items():
-        key2 = key
-        if mapping and key in KEY_MAPPING.keys():
-            key2 = KEY_MAPPING[key]
-        if key2 not in dict_all.keys():
-            dict_all[key2] = {'TP': 0, 'FP': 0, 'FN': 0, 'COUNT': 0,
-                             'PR': 0, 'COUNT_PR': 0, 'RC': 0, 'COUNT_RC': 0}
-        dict_all[key2] = add_measures(val_dict, dict_all[key2])
-    return dict_all
-
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='parse place-related questions into encodings, FOL and GeoSPARQL, '
+                                                 'writing one JSON result per line')
+    parser.add_argument('input', nargs='?', default='-', help="questions, one per line ('-' reads stdin)")
+    parser.add_argument('-o', '--output', default='-', help="JSONL output ('-' writes stdout)")
+    parser.add_argument('--chunk-size', type=int, default=16, help='questions per batched model call')
+    parser.add_argument('--workers', type=int, default=0, help='parse in this many forked processes')
+    parser.add_argument('--eval', action='store_true',
+                        help='evaluate each question interactively and write the labels into evaluation/eval.json')
+    parser.add_argument('--console', action='store_true', help='also write the console trace into console.txt')
+    parser.add_argument('--test', action='store_true', help='only parse the built-in dummy questions')
+    args = parser.parse_args()
+    is_console = args.console
+    is_test = args.test
+    is_eval = args.eval
+    logging.info('running parameters: test: {0}, console: {1}, eval: {2}'.format(str(is_test), str(is_console),
+                                                                                 str(is_eval)))
+    logging.info('reading dataset...')
+    if is_test:
+        questions = load_dummy_dataset()  # if you want to just test to check the function...
+    elif is_eval:
+        questions = load_dataset('data/datasets/GeoQuestion201.csv' if args.input == '-' else args.input)
+    else:
+        questions = iter_dataset(args.input)
 
-def calculate_mic_mac_measures(dict_all, only_precision=False):
-    new_dict = {}
-    if not only_precision:
-        print('KEY\t\t\tMAC_PR\t\tMAC_RC\t\tMAC_FS\t\t\tMIC_PR\t\tMIC_RC\t\tMIC_FS\t\tCOUNT')
+    if is_eval:
+        eval = read_labels()
+        analyze(questions)
     else:
-        print('KEY\t\t\tMAC_PR\t\t\tMIC_PR')
-    for key, val_dict in dict_all.items():
-        new_dict[key] = {}
-        new_dict[key]['MAC_PR'] = val_dict['PR'] / val_dict['COUNT_PR'] * 100
-        if not only_precision:
-            new_dict[key]['MAC_RC'] = val_dict['RC'] / val_dict['COUNT_RC'] * 100
-            new_dict[key]['MAC_FS'] = 2*new_dict[key]['MAC_RC']*new_dict[key]['MAC_PR']/\
-                                      (new_dict[key]['MAC_RC']+new_dict[key]['MAC_PR'])
-        new_dict[key]['MIC_PR'] = val_dict['TP'] / (val_dict['TP'] + val_dict['FP']) * 100
-        if not only_precision:
-            new_dict[key]['MIC_RC'] = val_dict['TP'] / (val_dict['TP'] + val_dict['FN']) * 100
-            new_dict[key]['MIC_FS'] = 2*new_dict[key]['MIC_RC']*new_dict[key]['MIC_PR']/\
-                                      (new_dict[key]['MIC_RC']+new_dict[key]['MIC_PR'])
-            print('{0: >12}\t{1:2.1f}\t\t{2:2.1f}\t\t{3:2.1f}\t\t\t{4:2.1f}\t\t{5:2.1f}\t\t{6:2.1f}\t\t{7}'.
-                  format(key, new_dict[key]['MAC_PR'], new_dict[key]['MAC_RC'], new_dict[key]['MAC_FS'],
-                         new_dict[key]['MIC_PR'], new_dict[key]['MIC_RC'], new_dict[key]['MIC_FS'],
-                         val_dict['TP'] + val_dict['FN']))
-        else:
-            print('{0: >12}\t{1:2.1f}\t\t\t{2:2.1f}\t\t\t{3}'.
-                  format(key, new_dict[key]['MAC_PR'], new_dict[key]['MIC_PR']))
-    print('---------------------------------------------------------------------------------------------------------\n')
-    return new_dict
-
-
-def to_int(string):
-    if isinstance(string, int):
-        return string
-    if string.strip() == '':
-        return 0
-    return int(string)
-
-
-if is_eval or len(eval) > 0:
-    logging.info('reading manually investigated results to derive evaluation measure...')
-    encoding_evaluation = {}
-    fol_evaluation = {}
-    geosparql_evaluation = {}
-    for question in eval.keys():
-        # encoding precision, recall and f-score...
-        encoding_evaluation = add_question_measures(eval[question]['encoding'], encoding_evaluation, mapping=True)
-
-        # encoding precision, recall and f-score: for intent only accuracy
-        fol_evaluation = add_question_measures(eval[question]['fol'], fol_evaluation)
-
-        # accuracy for overall, intent, where, order by, group by
-        geosparql_evaluation = add_question_measures(eval[question]['geosparql'], geosparql_evaluation)
-
-    encodings_results = calculate_mic_mac_measures(encoding_evaluation)
-    fol_results = calculate_mic_mac_measures(fol_evaluation)
-    geosparql_results = calculate_mic_mac_measures(geosparql_evaluation)
+        if is_console:
+            clean_file()
+        output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+        try:
+            count = stream(questions, output, chunk_size=args.chunk_size, workers=args.workers)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        logging.info('parsed {} questions'.format(count))
+
+    if is_eval or len(eval) > 0:
+        logging.info('reading manually investigated results to derive evaluation measure...')
+        evaluation = EvaluationSet(eval)
+        for section, measures in evaluation.measures().items():
+            print_measures(measures)
@@ -1,156 +1,769 @@
-import logging
-
-import sklearn
-
-from placequestionparsetree import AnyNode, PlaceQuestionParseTree, PlaceDependencyTree
-from allennlp.predictors.predictor import Predictor
-import allennlp_models.rc
-from allennlp.modules.elmo import Elmo, batch_to_ids
-
-logging.basicConfig(level=logging.INFO)
-nermodel = Predictor.from_path("https://storage.googleapis.com/allennlp-public-models/fine-grained-ner.2020-06-24.tar.gz")
-nercoasemodel = Predictor.from_path("https://storage.googleapis.com/allennlp-public-models/ner-model-2020.02.10.tar.gz")
-parsemodel = Predictor.from_path("https://storage.googleapis.com/allennlp-public-models/elmo-constituency-parser-2020.02.10.tar.gz")
-dependencymodel = Predictor.from_path("https://storage.googleapis.com/allennlp-public-models/biaffine-dependency-parser-ptb-2020.04.06.tar.gz")
-
-up_name_tags = ['U-GPE', 'U-LOC', 'U-FAC', 'U-ORG']
-cp_name_tags = ['B-GPE', 'B-LOC', 'B-FAC', 'B-ORG', 'I-GPE', 'I-LOC', 'I-FAC', 'I-ORG', 'L-GPE', 'L-LOC', 'L-FAC',
-                'L-ORG']
-
-u_date_tags = ['U-DATE']
-cp_date_tags = ['B-DATE', 'I-DATE', 'L-DATE']
-
-u_event_tags = ['U-EVENT']
-cp_event_tags = ['B-EVENT', 'I-EVENT', 'L-EVENT']
-
-noun_phrase_tags = ['NN, NNS']
-
-class NER:
-    @staticmethod
-    def parse(sentence):
-        res = nermodel.predict(sentence=sentence)
-        return res
-
-    @staticmethod
-    def parse_coarse(sentence):
-        return nercoasemodel.predict(sentence)
-
-    @staticmethod
-    def extract_entities(sentence, u_list, cp_list, is_coarse = False):
-        entities = []
-        if is_coarse:
-            parsed = NER.parse_coarse(sentence)
-        else:
-            parsed = NER.parse(sentence)
-        current = ''
-        for i in range(0, len(parsed['tags'])):
-            logging.debug('i: {} word: {} and tag: {}'.format(i, parsed['words'][i], parsed['tags'][i]))
-            if parsed['tags'][i] in u_list:
-                entities.append(parsed['words'][i])
-            elif parsed['tags'][i] in cp_list:
-                if parsed['tags'][i].startswith('B-'):
-                    current = parsed['words'][i] + ' '
-                elif parsed['tags'][i].startswith('L-'):
-                    current += parsed['words'][i]
-                    entities.append(current)
-                else:
-                    current += parsed['words'][i] + ' '
-        return entities
-
-    @staticmethod
-    def extract_place_names(sentence):
-        fine_grains = NER.extract_entities(sentence, up_name_tags, cp_name_tags)
-        coarse_grains = NER.extract_entities(sentence, up_name_tags, cp_name_tags, is_coarse=True)
-        if len(fine_grains) >= len(coarse_grains):
-            return fine_grains
-        else:
-            for loc in coarse_grains:
-                found = False
-                for floc in fine_grains:
-                    if loc in floc:
-                        found = True
-                        break
-                    elif floc in loc:
-                        del fine_grains[floc]
-                        fine_grains.append(loc)
-                        found = True
-                        break
-                if not found:
-                    fine_grains.append(loc)
-        return fine_grains
-
-
-    @staticmethod
-    def extract_dates(sentence):
-        return NER.extract_entities(sentence, u_date_tags, cp_date_tags)
-
-    @staticmethod
-    def extract_events(sentence):
-        return NER.extract_entities(sentence, u_event_tags, cp_event_tags)
-
-
-class CPARSER:
-    @staticmethod
-    def parse(sentence):
-        res = parsemodel.predict(sentence)
-        return res['hierplane_tree']['root']
-
-    @staticmethod
-    def construct_tree(sentence):
-        parse_results = CPARSER.parse(sentence)
-        return PlaceQuestionParseTree(parse_results)
-
-
-class DPARSER:
-    @staticmethod
-    def parse(sentence):
-        res = dependencymodel.predict(sentence)
-        return res['hierplane_tree']['root']
-
-    @staticmethod
-    def construct_tree(sentence):
-        parse_results = DPARSER.parse(sentence)
-        return PlaceDependencyTree(parse_results)
-
-
-class Embedding:
-    # loading ELMo pretrained word embedding model
-    options_file = "https://s3-us-west-2.amazonaws.com/allennlp/models/elmo/2x4096_512_2048cnn_2xhighway/elmo_2x4096_512_2048cnn_2xhighway_options.json"
-    weight_file = "https://s3-us-west-2.amazonaws.com/allennlp/models/elmo/2x4096_512_2048cnn_2xhighway/elmo_2x4096_512_2048cnn_2xhighway_weights.hdf5"
-
-    elmo = Elmo(options_file, weight_file, 2, dropout=0)
-
-    activity_embs = None
-    situation_embs = None
-
-    @staticmethod
-    def verb_encoding(sentence, verbs):
-        if not Embedding.is_loaded():
-            raise RuntimeError from None
-        decisions = []
-        emb = Embedding.elmo(batch_to_ids([sentence.split()]))['elmo_representations'][0].detach().numpy()
-        for verb in verbs:
-            v_index = sentence.split().index(verb)
-            verb_emb = [emb[0][v_index]]
-            stav_similar = sklearn.metrics.pairwise.cosine_similarity(Embedding.situation_embs.squeeze(),
-                                                                      verb_emb).max()
-            actv_similar = sklearn.metrics.pairwise.cosine_similarity(Embedding.activity_embs.squeeze(), verb_emb).max()
-            if actv_similar > max(stav_similar, 0.35):
-                decisions.append('a')
-            elif stav_similar > max(actv_similar, 0.35):
-                decisions.append('s')
-            else:
-                decisions.append('u')
-        return decisions
-
-    @staticmethod
-    def set_stative_active_words(stative, active):
-        # Verb Elmo representation
-        Embedding.activity_embs = Embedding.elmo(batch_to_ids([[v] for v in active]))['elmo_representations'][0].detach().numpy()
-        Embedding.situation_embs = Embedding.elmo(batch_to_ids([[v] for v in stative]))['elmo_representations'][0].detach().numpy()
-
-    @staticmethod
-    def is_loaded():
-        if Embedding.situation_embs is None or Embedding.activity_embs is None:
-            return False
-        return True
+import base64
+import contextlib
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from annindex import IVFIndex
+from gazetteer import Gazetteer, name_spans, tokenize
+from placequestionparsetree import PlaceQuestionParseTree, PlaceDependencyTree
+from predictioncache import PredictionCache
+
+logging.basicConfig(level=logging.INFO)
+
+MODEL_ARCHIVES = {
+    'ner': 'https://storage.googleapis.com/allennlp-public-models/fine-grained-ner.2020-06-24.tar.gz',
+    'ner_coarse': 'https://storage.googleapis.com/allennlp-public-models/ner-model-2020.02.10.tar.gz',
+    'constituency': 'https://storage.googleapis.com/allennlp-public-models/elmo-constituency-parser-2020.02.10.tar.gz',
+    'dependency': 'https://storage.googleapis.com/allennlp-public-models/biaffine-dependency-parser-ptb-2020.04.06.tar.gz',
+    'elmo_options': 'https://s3-us-west-2.amazonaws.com/allennlp/models/elmo/2x4096_512_2048cnn_2xhighway/'
+                    'elmo_2x4096_512_2048cnn_2xhighway_options.json',
+    'elmo_weights': 'https://s3-us-west-2.amazonaws.com/allennlp/models/elmo/2x4096_512_2048cnn_2xhighway/'
+                    'elmo_2x4096_512_2048cnn_2xhighway_weights.hdf5'
+}
+
+# the part of each predictor's output that the pipeline uses, this is also what the prediction cache stores
+MODEL_OUTPUTS = {
+    'ner': lambda res: {'words': res['words'], 'tags': res['tags']},
+    'ner_coarse': lambda res: {'words': res['words'], 'tags': res['tags']},
+    'constituency': lambda res: res['hierplane_tree']['root'],
+    'dependency': lambda res: res['hierplane_tree']['root']
+}
+
+
+# lazily loads the AllenNLP predictors and ELMo, each one on its first use
+class ModelRegistry:
+    archives = dict(MODEL_ARCHIVES)
+    cache_dir = os.environ.get('GEOPARSER_MODEL_DIR')
+    offline = os.environ.get('GEOPARSER_OFFLINE', '') not in ('', '0')
+    max_batch_size = int(os.environ.get('GEOPARSER_BATCH_SIZE', 32))
+    max_batch_tokens = int(os.environ.get('GEOPARSER_BATCH_TOKENS', 1024))
+    reuse_parser_elmo = os.environ.get('GEOPARSER_REUSE_ELMO', '') not in ('', '0')
+    captures = {}
+    models = {}
+    timings = {}
+    cache = PredictionCache(os.environ['GEOPARSER_CACHE']) if os.environ.get('GEOPARSER_CACHE') else None
+    lock = threading.RLock()
+
+    @staticmethod
+    def configure(cache_dir=None, archives=None, offline=None, max_batch_size=None, max_batch_tokens=None,
+                  cache=None, reuse_parser_elmo=None):
+        with ModelRegistry.lock:
+            if reuse_parser_elmo is not None:
+                ModelRegistry.reuse_parser_elmo = reuse_parser_elmo
+            if cache is not None:
+                ModelRegistry.cache = cache if isinstance(cache, PredictionCache) else PredictionCache(cache)
+            if max_batch_size is not None:
+                ModelRegistry.max_batch_size = max_batch_size
+            if max_batch_tokens is not None:
+                ModelRegistry.max_batch_tokens = max_batch_tokens
+            if cache_dir is not None:
+                ModelRegistry.cache_dir = cache_dir
+            if archives is not None:
+                ModelRegistry.archives.update(archives)
+            if offline is not None:
+                ModelRegistry.offline = offline
+
+    @staticmethod
+    def resolve(name):
+        archive = ModelRegistry.archives[name]
+        if os.path.exists(archive):
+            return archive
+        if ModelRegistry.cache_dir is not None:
+            local = os.path.join(ModelRegistry.cache_dir, os.path.basename(archive))
+            if os.path.exists(local):
+                return local
+        if ModelRegistry.offline:
+            raise FileNotFoundError('model archive for {} is not available locally: {}'.format(name, archive))
+        return archive
+
+    @staticmethod
+    def identity(name):
+        return os.path.basename(ModelRegistry.archives[name])
+
+    @staticmethod
+    def get(name):
+        model = ModelRegistry.models.get(name)
+        if model is not None:
+            return model
+        with ModelRegistry.lock:
+            if name not in ModelRegistry.models:
+                start = time.perf_counter()
+                ModelRegistry.models[name] = ModelRegistry.load(name)
+                ModelRegistry.timings[name] = time.perf_counter() - start
+                logging.info('loaded model {0} in {1:.2f}s'.format(name, ModelRegistry.timings[name]))
+            return ModelRegistry.models[name]
+
+    @staticmethod
+    def load(name):
+        if name == 'elmo':
+            from allennlp.modules.elmo import Elmo
+            return Elmo(ModelRegistry.resolve('elmo_options'), ModelRegistry.resolve('elmo_weights'), 2, dropout=0)
+        from allennlp.predictors.predictor import Predictor
+        import allennlp_models.rc
+        return Predictor.from_path(ModelRegistry.resolve(name))
+
+    @staticmethod
+    def is_loaded(name):
+        return name in ModelRegistry.models
+
+    # True if the model is loaded or can be: AllenNLP is installed and its archives resolve (offline, to local files)
+    @staticmethod
+    def available(name):
+        if ModelRegistry.is_loaded(name):
+            return True
+        if importlib.util.find_spec('allennlp') is None:
+            return False
+        try:
+            for archive in (['elmo_options', 'elmo_weights'] if name == 'elmo' else [name]):
+                ModelRegistry.resolve(archive)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @staticmethod
+    def predict(name, sentence):
+        return ModelRegistry.predict_batch(name, [sentence])[0]
+
+    # cached outputs are served first, the misses go through length-bucketed dynamic batching: sentences are
+    # sorted by length and a batch is closed when it reaches max_batch_size or its padded size would exceed
+    # max_batch_tokens; outputs come back in input order. If an embeddings list is given and the model runs ELMo,
+    # its per-token activations for the freshly predicted sentences are stored there (cache hits stay None)
+    @staticmethod
+    def predict_batch(name, sentences, max_batch_size=None, embeddings=None):
+        results = [None] * len(sentences)
+        if ModelRegistry.cache is not None:
+            results = ModelRegistry.cache.get_many(ModelRegistry.identity(name), sentences)
+        missing = [i for i in range(len(sentences)) if results[i] is None]
+        if len(missing) == 0:
+            return results
+        max_batch_size = max_batch_size or ModelRegistry.max_batch_size
+        model = ModelRegistry.get(name)
+        lengths = {i: len(sentences[i].split()) for i in missing}
+        order = sorted(missing, key=lambda i: lengths[i])
+        batches = []
+        batch = []
+        for i in order:
+            if len(batch) > 0 and (len(batch) >= max_batch_size or
+                                   (len(batch) + 1) * lengths[i] > ModelRegistry.max_batch_tokens):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        batches.append(batch)
+        capture = None
+        if embeddings is not None:
+            capture = ModelRegistry.capture(name)
+        for batch in batches:
+            inputs = [{'sentence': sentences[i]} for i in batch]
+            if capture is None:
+                outputs = model.predict_batch_json(inputs)
+            else:
+                with capture.record() as captured:
+                    outputs = model.predict_batch_json(inputs)
+                for i, output, activations in zip(batch, outputs, ElmoCapture.instances(captured)):
+                    if len(activations) == len(output['tokens']):
+                        embeddings[i] = activations
+            for i, output in zip(batch, outputs):
+                results[i] = MODEL_OUTPUTS[name](output)
+        if ModelRegistry.cache is not None:
+            ModelRegistry.cache.put_many(ModelRegistry.identity(name), [sentences[i] for i in missing],
+                                         [results[i] for i in missing])
+        return results
+
+    @staticmethod
+    def capture(name):
+        with ModelRegistry.lock:
+            if name not in ModelRegistry.captures:
+                ModelRegistry.captures[name] = ElmoCapture.find(ModelRegistry.get(name))
+            return ModelRegistry.captures[name]
+
+    @staticmethod
+    def preload(names=('ner', 'ner_coarse', 'constituency', 'dependency', 'elmo')):
+        for name in names:
+            ModelRegistry.get(name)
+        return dict(ModelRegistry.timings)
+
+
+# records the contextual token embeddings the ELMo inside a predictor (the constituency parser) computes, so verb
+# classification can reuse them instead of running its own ELMo pass. The three biLM layers are averaged like the
+# standalone Embedding ELMo does with its untrained scalar mix, so the vectors are comparable to the prototypes.
+# A forward hook is registered only for the duration of one record() block and keeps only the forward passes of the
+# thread that opened it, into a list owned by that block, so concurrent predictions never see each other's batches.
+class ElmoCapture:
+    def __init__(self, module):
+        self.module = module
+
+    @staticmethod
+    def find(predictor):
+        from allennlp.modules.elmo import _ElmoBiLm
+        for module in predictor._model.modules():
+            if isinstance(module, _ElmoBiLm):
+                return ElmoCapture(module)
+        logging.warning('no ELMo found inside the predictor, verb encoding keeps its own ELMo pass')
+        return None
+
+    @contextlib.contextmanager
+    def record(self):
+        batches = []
+        thread = threading.get_ident()
+
+        def hook(module, inputs, output):
+            if threading.get_ident() == thread:
+                batches.append(ElmoCapture.average(output))
+
+        handle = self.module.register_forward_hook(hook)
+        try:
+            yield batches
+        finally:
+            handle.remove()
+
+    @staticmethod
+    def average(output):
+        import torch
+        from allennlp.nn.util import remove_sentence_boundaries
+        layers = []
+        mask = None
+        for activations in output['activations']:
+            layer, mask = remove_sentence_boundaries(activations, output['mask'])
+            layers.append(layer)
+        return torch.stack(layers).mean(dim=0).detach().cpu().numpy(), mask.cpu().numpy()
+
+    # the per-token activations of every sentence of the recorded batches, in order
+    @staticmethod
+    def instances(batches):
+        res = []
+        for activations, mask in batches:
+            for i in range(len(activations)):
+                res.append(activations[i][mask[i].astype(bool)])
+        return res
+
+
+up_name_tags = ['U-GPE', 'U-LOC', 'U-FAC', 'U-ORG']
+cp_name_tags = ['B-GPE', 'B-LOC', 'B-FAC', 'B-ORG', 'I-GPE', 'I-LOC', 'I-FAC', 'I-ORG', 'L-GPE', 'L-LOC', 'L-FAC',
+                'L-ORG']
+
+u_date_tags = ['U-DATE']
+cp_date_tags = ['B-DATE', 'I-DATE', 'L-DATE']
+
+u_event_tags = ['U-EVENT']
+cp_event_tags = ['B-EVENT', 'I-EVENT', 'L-EVENT']
+
+noun_phrase_tags = ['NN, NNS']
+
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october',
+          'november', 'december', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec']
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+DATE_WORDS = ['today', 'yesterday', 'tomorrow', 'century', 'decade', 'year', 'years', 'month', 'week']
+EVENT_WORDS = ['olympics', 'games', 'festival', 'war', 'championship', 'cup', 'marathon', 'fair', 'expo', 'carnival',
+               'election', 'earthquake', 'hurricane', 'attack', 'rebellion', 'revolution', 'battle', 'tournament']
+
+# bump when the layout of the precomputed verb prototype files changes
+PROTOTYPE_FORMAT = 'normalized-1'
+
+
+# tagged output of the fine-grained and coarse NER models for one sentence, each model runs at most once
+class NERResult:
+    def __init__(self, sentence, fine=None, coarse=None):
+        self.sentence = sentence
+        self._fine = fine
+        self._coarse = coarse
+
+    @property
+    def fine(self):
+        if self._fine is None:
+            self._fine = NER.parse(self.sentence)
+        return self._fine
+
+    @property
+    def coarse(self):
+        if self._coarse is None:
+            self._coarse = NER.parse_coarse(self.sentence)
+        return self._coarse
+
+    def entities(self, u_list, cp_list, is_coarse=False):
+        if is_coarse:
+            return NER.decode_entities(self.coarse, u_list, cp_list)
+        return NER.decode_entities(self.fine, u_list, cp_list)
+
+    # the coarse model can only add place names the fine-grained one missed, so it is skipped when every capitalized
+    # span is already tagged as a place or a known toponym
+    def needs_coarse(self):
+        return not Gazetteer.default().covers(self.fine['words'], self.fine['tags'], up_name_tags + cp_name_tags)
+
+    def place_names(self):
+        fine_grains = self.entities(up_name_tags, cp_name_tags)
+        if self._coarse is None and not self.needs_coarse():
+            return fine_grains
+        coarse_grains = self.entities(up_name_tags, cp_name_tags, is_coarse=True)
+        if len(fine_grains) >= len(coarse_grains):
+            return fine_grains
+        else:
+            for loc in coarse_grains:
+                found = False
+                for floc in fine_grains:
+                    if loc in floc:
+                        found = True
+                        break
+                    elif floc in loc:
+                        fine_grains.remove(floc)
+                        fine_grains.append(loc)
+                        found = True
+                        break
+                if not found:
+                    fine_grains.append(loc)
+        return fine_grains
+
+    def dates(self):
+        return self.entities(u_date_tags, cp_date_tags)
+
+    def events(self):
+        return self.entities(u_event_tags, cp_event_tags)
+
+
+# a NER backend tags sentences in the AllenNLP format, {'words': [...], 'tags': [...]} with BIOUL tags, once with
+# fine-grained labels (GPE, LOC, FAC, ORG, DATE, EVENT, ...) and once with the coarse ones (LOC, ORG, PER, MISC)
+class NERBackend:
+    def parse_batch(self, sentences, max_batch_size=None):
+        raise NotImplementedError
+
+    def parse_coarse_batch(self, sentences, max_batch_size=None):
+        raise NotImplementedError
+
+
+class AllenNLPBackend(NERBackend):
+    def parse_batch(self, sentences, max_batch_size=None):
+        return ModelRegistry.predict_batch('ner', sentences, max_batch_size)
+
+    def parse_coarse_batch(self, sentences, max_batch_size=None):
+        return ModelRegistry.predict_batch('ner_coarse', sentences, max_batch_size)
+
+
+# model-free tagger for a high-throughput mode: dates by regular expressions, toponyms from the gazetteer and other
+# names as runs of capitalized words. Overlaps go to dates first, then to the longer span. A name is an EVENT if
+# it ends with an event word and a LOC otherwise; the coarse tags are the same spans labelled LOC/MISC, so
+# place_names() keeps the fine-grained result.
+class LexiconBackend(NERBackend):
+    year_pattern = re.compile(r'^(1[0-9]{3}|20[0-9]{2})s?$')
+
+    def __init__(self, gazetteer=None):
+        self.gazetteer = gazetteer or Gazetteer.default()
+
+    def tokenize(self, sentence):
+        return [token for token, _, _ in tokenize(sentence)]
+
+    def is_date(self, words, i):
+        word = words[i].lower()
+        if LexiconBackend.year_pattern.match(word) or word in MONTHS or word in DAYS:
+            return True
+        # day of a month: 5 May, May 5
+        if word.isdigit() and len(word) <= 2:
+            return (i > 0 and words[i - 1].lower() in MONTHS) or (i + 1 < len(words) and
+                                                                  words[i + 1].lower() in MONTHS)
+        return word in DATE_WORDS and i > 0 and (words[i - 1].lower() in ('last', 'next', 'this') or
+                                                 LexiconBackend.year_pattern.match(words[i - 1]) is not None)
+
+    def date_spans(self, words):
+        spans = []
+        i = 0
+        while i < len(words):
+            if not self.is_date(words, i):
+                i += 1
+                continue
+            end = i + 1
+            while end < len(words) and self.is_date(words, end):
+                end += 1
+            start = i - 1 if i > 0 and words[i - 1].lower() in ('last', 'next', 'this') else i
+            spans.append((start, end, 'DATE'))
+            i = end
+        return spans
+
+    def spans(self, words):
+        candidates = [(0, span) for span in self.date_spans(words)]
+        candidates += [(1, span) for span in self.gazetteer.match(words)]
+        candidates += [(1, (start, end, 'EVENT' if words[end - 1].lower() in EVENT_WORDS else 'LOC'))
+                       for start, end in name_spans(words)]
+        candidates.sort(key=lambda c: (c[0], c[1][0] - c[1][1]))
+        taken = [False] * len(words)
+        spans = []
+        for _, (start, end, label) in candidates:
+            if not any(taken[start: end]):
+                spans.append((start, end, label))
+                for i in range(start, end):
+                    taken[i] = True
+        return sorted(spans)
+
+    @staticmethod
+    def to_bioul(words, spans, labels=None):
+        tags = ['O'] * len(words)
+        for start, end, label in spans:
+            label = label if labels is None else labels.get(label, label)
+            if end - start == 1:
+                tags[start] = 'U-' + label
+                continue
+            tags[start] = 'B-' + label
+            for i in range(start + 1, end - 1):
+                tags[i] = 'I-' + label
+            tags[end - 1] = 'L-' + label
+        return {'words': words, 'tags': tags}
+
+    def parse_batch(self, sentences, max_batch_size=None):
+        res = []
+        for sentence in sentences:
+            words = self.tokenize(sentence)
+            res.append(LexiconBackend.to_bioul(words, self.spans(words)))
+        return res
+
+    def parse_coarse_batch(self, sentences, max_batch_size=None):
+        res = []
+        for sentence in sentences:
+            words = self.tokenize(sentence)
+            spans = [span for span in self.spans(words) if span[2] != 'DATE']
+            res.append(LexiconBackend.to_bioul(words, spans, {'GPE': 'LOC', 'EVENT': 'MISC'}))
+        return res
+
+
+NER_BACKENDS = {'allennlp': AllenNLPBackend, 'lexicon': LexiconBackend}
+
+
+class NER:
+    backend = NER_BACKENDS[os.environ.get('GEOPARSER_NER_BACKEND', 'allennlp')]()
+
+    # backend is a name from NER_BACKENDS or a NERBackend instance
+    @staticmethod
+    def configure(backend):
+        NER.backend = NER_BACKENDS[backend]() if isinstance(backend, str) else backend
+
+    @staticmethod
+    def parse(sentence):
+        return NER.parse_batch([sentence])[0]
+
+    @staticmethod
+    def parse_coarse(sentence):
+        return NER.parse_coarse_batch([sentence])[0]
+
+    @staticmethod
+    def parse_batch(sentences, max_batch_size=None):
+        return NER.backend.parse_batch(sentences, max_batch_size)
+
+    @staticmethod
+    def parse_coarse_batch(sentences, max_batch_size=None):
+        return NER.backend.parse_coarse_batch(sentences, max_batch_size)
+
+    @staticmethod
+    def recognize(sentence):
+        if isinstance(sentence, NERResult):
+            return sentence
+        return NERResult(sentence)
+
+    @staticmethod
+    def recognize_batch(sentences, max_batch_size=None):
+        results = [NERResult(sentence, fine) for sentence, fine in zip(sentences,
+                                                                       NER.parse_batch(sentences, max_batch_size))]
+        pending = [i for i, result in enumerate(results) if result.needs_coarse()]
+        if len(pending) > 0:
+            coarses = NER.parse_coarse_batch([sentences[i] for i in pending], max_batch_size)
+            for i, coarse in zip(pending, coarses):
+                results[i]._coarse = coarse
+        return results
+
+    @staticmethod
+    def decode_entities(parsed, u_list, cp_list):
+        entities = []
+        current = ''
+        for i in range(0, len(parsed['tags'])):
+            logging.debug('i: {} word: {} and tag: {}'.format(i, parsed['words'][i], parsed['tags'][i]))
+            if parsed['tags'][i] in u_list:
+                entities.append(parsed['words'][i])
+            elif parsed['tags'][i] in cp_list:
+                if parsed['tags'][i].startswith('B-'):
+                    current = parsed['words'][i] + ' '
+                elif parsed['tags'][i].startswith('L-'):
+                    current += parsed['words'][i]
+                    entities.append(current)
+                else:
+                    current += parsed['words'][i] + ' '
+        return entities
+
+    @staticmethod
+    def extract_entities(sentence, u_list, cp_list, is_coarse = False):
+        return NER.recognize(sentence).entities(u_list, cp_list, is_coarse=is_coarse)
+
+    @staticmethod
+    def extract_place_names(sentence):
+        return NER.recognize(sentence).place_names()
+
+    @staticmethod
+    def extract_dates(sentence):
+        return NER.recognize(sentence).dates()
+
+    @staticmethod
+    def extract_events(sentence):
+        return NER.recognize(sentence).events()
+
+
+class CPARSER:
+    @staticmethod
+    def parse(sentence):
+        return ModelRegistry.predict('constituency', sentence)
+
+    # with reuse_parser_elmo on, embeddings (a list as long as sentences) receives each sentence's ELMo activations
+    @staticmethod
+    def parse_batch(sentences, max_batch_size=None, embeddings=None):
+        if not ModelRegistry.reuse_parser_elmo:
+            embeddings = None
+        return ModelRegistry.predict_batch('constituency', sentences, max_batch_size, embeddings=embeddings)
+
+    @staticmethod
+    def construct_tree(sentence, parse_results=None):
+        if parse_results is None:
+            parse_results = CPARSER.parse(sentence)
+        return PlaceQuestionParseTree(parse_results)
+
+    @staticmethod
+    def construct_trees(sentences, max_batch_size=None):
+        return [PlaceQuestionParseTree(parse_results) for parse_results in CPARSER.parse_batch(sentences,
+                                                                                               max_batch_size)]
+
+
+class DPARSER:
+    @staticmethod
+    def parse(sentence):
+        return ModelRegistry.predict('dependency', sentence)
+
+    @staticmethod
+    def parse_batch(sentences, max_batch_size=None):
+        return ModelRegistry.predict_batch('dependency', sentences, max_batch_size)
+
+    @staticmethod
+    def construct_tree(sentence, parse_results=None):
+        if parse_results is None:
+            parse_results = DPARSER.parse(sentence)
+        return PlaceDependencyTree(parse_results)
+
+    @staticmethod
+    def construct_trees(sentences, max_batch_size=None):
+        return [PlaceDependencyTree(parse_results) for parse_results in DPARSER.parse_batch(sentences,
+                                                                                            max_batch_size)]
+
+
+class Embedding:
+    prototype_dir = os.environ.get('GEOPARSER_PROTOTYPE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'geoparser', 'prototypes'))
+    activity_embs = None
+    situation_embs = None
+    activity_index = None
+    situation_index = None
+    indexed = None
+    lexicons = None
+
+    @staticmethod
+    def verb_encoding(sentence, verbs, embeddings=None):
+        return Embedding.classify_verbs([sentence], [verbs], embeddings=[embeddings])[0]
+
+    # one ELMo pass over all sentences and one matrix multiply for all their verbs, returns 'a'/'s'/'u' decisions
+    # per sentence and, if asked, the [stative, active] similarity scores behind them. Sentences whose token
+    # embeddings are already known (captured from the constituency parser) skip the ELMo pass.
+    @staticmethod
+    def classify_verbs(sentences, verbs_list, return_scores=False, embeddings=None):
+        if not Embedding.is_loaded():
+            Embedding.load_lexicons()
+        if not Embedding.is_loaded():
+            raise RuntimeError from None
+        tokens = [sentence.split() for sentence in sentences]
+        rows = []
+        columns = []
+        for i, verbs in enumerate(verbs_list):
+            for verb in verbs:
+                rows.append(i)
+                columns.append(tokens[i].index(verb))
+        if embeddings is None:
+            embeddings = [None] * len(sentences)
+        vectors = np.zeros((len(rows), Embedding.activity_embs.shape[1]), dtype=np.float32)
+        pending = [i for i in set(rows) if embeddings[i] is None or len(embeddings[i]) != len(tokens[i])]
+        if len(pending) > 0:
+            embeddings = list(embeddings)
+            for i, emb in zip(pending, Embedding.embed_sentences([tokens[i] for i in pending])):
+                embeddings[i] = emb
+        for k in range(len(rows)):
+            vectors[k] = embeddings[rows[k]][columns[k]]
+        scores = Embedding.verb_scores(vectors)
+        decisions = Embedding.decide(scores)
+        res_decisions = []
+        res_scores = []
+        offset = 0
+        for verbs in verbs_list:
+            res_decisions.append(decisions[offset: offset + len(verbs)].tolist())
+            res_scores.append(scores[offset: offset + len(verbs)])
+            offset += len(verbs)
+        if return_scores:
+            return res_decisions, res_scores
+        return res_decisions
+
+    # max cosine similarity of each row against the stative and the active prototypes (both pre-normalized),
+    # answered by an IVF index once a lexicon outgrows an exact scan
+    @staticmethod
+    def verb_scores(vectors):
+        vectors = Embedding.normalize(np.asarray(vectors, dtype=np.float32))
+        scores = np.zeros((len(vectors), 2), dtype=np.float32)
+        if len(vectors) > 0:
+            situation_index, activity_index = Embedding.indexes()
+            scores[:, 0] = situation_index.max_similarity(vectors)
+            scores[:, 1] = activity_index.max_similarity(vectors)
+        return scores
+
+    # the indexes are rebuilt whenever the prototype matrices are replaced
+    @staticmethod
+    def indexes():
+        if Embedding.indexed is None or Embedding.indexed[0] is not Embedding.situation_embs or \
+                Embedding.indexed[1] is not Embedding.activity_embs:
+            Embedding.situation_index = IVFIndex(Embedding.situation_embs)
+            Embedding.activity_index = IVFIndex(Embedding.activity_embs)
+            Embedding.indexed = (Embedding.situation_embs, Embedding.activity_embs)
+        return Embedding.situation_index, Embedding.activity_index
+
+    @staticmethod
+    def decide(scores, threshold=0.35):
+        stav_similar = scores[:, 0]
+        actv_similar = scores[:, 1]
+        decisions = np.full(len(scores), 'u')
+        decisions[stav_similar > np.maximum(actv_similar, threshold)] = 's'
+        decisions[actv_similar > np.maximum(stav_similar, threshold)] = 'a'
+        return decisions
+
+    @staticmethod
+    def normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    # ELMo token vectors of tokenized sentences; with a prediction cache configured they are stored there (as
+    # base64 float32) like the predictor outputs, so recorded runs replay without the model
+    @staticmethod
+    def embed_sentences(token_lists):
+        sentences = [' '.join(tokens) for tokens in token_lists]
+        res = [None] * len(sentences)
+        cache = ModelRegistry.cache
+        if cache is not None:
+            for i, value in enumerate(cache.get_many(ModelRegistry.identity('elmo_weights'), sentences)):
+                if value is not None:
+                    res[i] = np.frombuffer(base64.b64decode(value['data']), dtype=np.float32).reshape(value['shape'])
+        missing = [i for i in range(len(sentences)) if res[i] is None]
+        if len(missing) == 0:
+            return res
+        if not ModelRegistry.available('elmo'):
+            raise FileNotFoundError('ELMo is not available to embed {0} sentences missing from the prediction '
+                                    'cache'.format(len(missing)))
+        from allennlp.modules.elmo import batch_to_ids
+        emb = ModelRegistry.get('elmo')(batch_to_ids([token_lists[i] for i in missing]))['elmo_representations'][0] \
+            .detach().numpy()
+        for k, i in enumerate(missing):
+            res[i] = emb[k, :len(token_lists[i])]
+        if cache is not None:
+            cache.put_many(ModelRegistry.identity('elmo_weights'), [sentences[i] for i in missing],
+                           [{'shape': list(res[i].shape),
+                             'data': base64.b64encode(res[i].astype(np.float32).tobytes()).decode('ascii')}
+                            for i in missing])
+        return res
+
+    # Verb Elmo representation, each word embedded as a one-token sentence so the prediction cache records it too
+    @staticmethod
+    def embed_words(words):
+        return np.stack([emb[0] for emb in Embedding.embed_sentences([[w] for w in words])])
+
+    @staticmethod
+    def set_stative_active_words(stative, active):
+        Embedding.activity_embs = Embedding.normalize(Embedding.embed_words(list(active)))
+        Embedding.situation_embs = Embedding.normalize(Embedding.embed_words(list(stative)))
+
+    # lexicons are only read when the first verb is classified
+    @staticmethod
+    def register_lexicons(stative_path, active_path):
+        Embedding.lexicons = {'stative': stative_path, 'active': active_path}
+        Embedding.activity_embs = None
+        Embedding.situation_embs = None
+
+    @staticmethod
+    def load_lexicons():
+        if Embedding.lexicons is None:
+            return
+        Embedding.activity_embs = Embedding.load_prototypes(Embedding.lexicons['active'])
+        Embedding.situation_embs = Embedding.load_prototypes(Embedding.lexicons['stative'])
+
+    @staticmethod
+    def read_lexicon(lexicon_path):
+        with open(lexicon_path, 'r', encoding='utf8') as flex:
+            return sorted(set(line.strip() for line in flex.readlines() if line.strip() != ''))
+
+    @staticmethod
+    def lexicon_checksum(words):
+        string = PROTOTYPE_FORMAT + '\n' + '\n'.join(sorted(set(words)))
+        return hashlib.sha256(string.encode('utf-8')).hexdigest()
+
+    # precomputed prototypes (rows L2-normalized): <lexicon>.npy (memory-mapped, checked against <lexicon>.sha256)
+    # as buildprototypes.py writes them, or the legacy <lexicon>.hdf5 with one dataset per verb if it holds every
+    # verb. Otherwise the whole lexicon is embedded once (by ELMo or from a recorded prediction cache) into
+    # prototype_dir, under a name holding the lexicon checksum; without ELMo and cached vectors loading fails
+    @staticmethod
+    def load_prototypes(lexicon_path):
+        words = Embedding.read_lexicon(lexicon_path)
+        base = os.path.splitext(lexicon_path)[0]
+        checksum = Embedding.lexicon_checksum(words)
+        if os.path.exists(base + '.npy') and os.path.exists(base + '.sha256'):
+            with open(base + '.sha256', 'r') as fsum:
+                if fsum.read().strip() == checksum:
+                    return np.load(base + '.npy', mmap_mode='r')
+            logging.warning('{} is out of date with {}'.format(base + '.npy', lexicon_path))
+        cached = os.path.join(Embedding.prototype_dir,
+                              '{0}-{1}.npy'.format(os.path.basename(base), checksum[:16]))
+        if os.path.exists(cached):
+            return np.load(cached, mmap_mode='r')
+        vectors = {}
+        if os.path.exists(base + '.hdf5'):
+            import h5py
+            with h5py.File(base + '.hdf5', 'r') as fh5:
+                for word in words:
+                    if word in fh5:
+                        vectors[word] = fh5[word][0]
+        if len(vectors) == len(words):
+            return Embedding.normalize(np.stack([vectors[word] for word in words]).astype(np.float32))
+        logging.warning('{0} of the {1} verbs of {2} have no precomputed prototype, embedding the lexicon into '
+                        '{3}'.format(len(words) - len(vectors), len(words), lexicon_path, cached))
+        try:
+            prototypes = Embedding.normalize(Embedding.embed_words(words).astype(np.float32))
+        except FileNotFoundError as e:
+            raise FileNotFoundError('no verb prototypes for {0} and no ELMo to build them, run buildprototypes.py '
+                                    'where ELMo is available'.format(lexicon_path)) from e
+        Embedding.save_atomically(cached, prototypes)
+        return np.load(cached, mmap_mode='r')
+
+    # other processes either see the complete file or none
+    @staticmethod
+    def save_atomically(path, array):
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.npy', delete=False) as ftmp:
+            np.save(ftmp, array)
+        os.replace(ftmp.name, path)
+
+    # writes <lexicon>.npy and <lexicon>.sha256 next to the lexicon, to be shipped with it
+    @staticmethod
+    def build_prototypes(lexicon_path):
+        words = Embedding.read_lexicon(lexicon_path)
+        base = os.path.splitext(lexicon_path)[0]
+        Embedding.save_atomically(base + '.npy', Embedding.normalize(Embedding.embed_words(words).astype(np.float32)))
+        with open(base + '.sha256', 'w') as fsum:
+            fsum.write(Embedding.lexicon_checksum(words) + '\n')
+        logging.info('wrote {0} prototypes for {1}'.format(len(words), lexicon_path))
+
+    @staticmethod
+    def is_loaded():
+        if Embedding.situation_embs is None or Embedding.activity_embs is None:
+            return False
+        return True
@@ -1,7 +1,393 @@
-from anytree import AnyNode, RenderTree, PostOrderIter
+import bisect
+import logging
 import re
+import sys
 
 import anytree.cachedsearch as search
+from anytree import LoopError, RenderTree, PostOrderIter, PreOrderIter, TreeError
+
+from spans import LabelSet
+
+
+# name -> nodes and (start, end) -> nodes lookups of one parse tree. The nodes keep it current themselves (see
+# TreeNode), so a lookup only sorts its hits into pre-order instead of searching the tree. Names that are slices of
+# the question text are kept under their (start, stop) offsets, a name is found there at each place it occurs in text.
+# The spans in the question are also kept sorted, so the spans that can cover a range are found by bisecting for its
+# start like SpanIndex does. version counts the changes to the tree, so indexes built over it can tell they are stale
+class NodeIndex:
+    def __init__(self, text=''):
+        self.text = text
+        self.names = {}
+        self.spans = {}
+        self.sorted_spans = []
+        self.version = 0
+
+    @staticmethod
+    def name_key(name):
+        if name.__class__ is slice:
+            return name.start, name.stop
+        return name
+
+    @staticmethod
+    def insert(table, key, node):
+        table.setdefault(key, {})[node] = None
+
+    @staticmethod
+    def remove(table, key, node):
+        nodes = table.get(key)
+        if nodes is not None:
+            nodes.pop(node, None)
+            if len(nodes) == 0:
+                del table[key]
+
+    # spans of nodes outside the question (None offsets) are only kept in the spans table
+    def insert_span(self, span, node):
+        if span not in self.spans and span[0] is not None and span[1] is not None:
+            bisect.insort(self.sorted_spans, span)
+        NodeIndex.insert(self.spans, span, node)
+
+    def remove_span(self, span, node):
+        NodeIndex.remove(self.spans, span, node)
+        if span not in self.spans and span[0] is not None and span[1] is not None:
+            i = bisect.bisect_left(self.sorted_spans, span)
+            if i < len(self.sorted_spans) and self.sorted_spans[i] == span:
+                del self.sorted_spans[i]
+
+    def add_subtree(self, node):
+        self.version += 1
+        for n in PreOrderIter(node):
+            n.index = self
+            NodeIndex.insert(self.names, NodeIndex.name_key(n._name), n)
+            self.insert_span((n.start, n.end), n)
+
+    def remove_subtree(self, node):
+        self.version += 1
+        for n in PreOrderIter(node):
+            NodeIndex.remove(self.names, NodeIndex.name_key(n._name), n)
+            self.remove_span((n.start, n.end), n)
+            n.index = None
+
+    def rename(self, node, name):
+        self.version += 1
+        NodeIndex.remove(self.names, NodeIndex.name_key(node._name), node)
+        NodeIndex.insert(self.names, NodeIndex.name_key(name), node)
+
+    def respan(self, node, start, end):
+        self.version += 1
+        self.remove_span((node.start, node.end), node)
+        self.insert_span((start, end), node)
+
+    def find_by_name(self, *names):
+        found = {}
+        for name in names:
+            found.update(self.names.get(name, {}))
+            start = self.text.find(name)
+            while start >= 0 and name != '':
+                found.update(self.names.get((start, start + len(name)), {}))
+                start = self.text.find(name, start + 1)
+        return NodeIndex.preorder(found)
+
+    def find_by_span(self, start, end):
+        return NodeIndex.preorder(self.spans.get((start, end), {}))
+
+    # nodes whose span covers [start, end], only the spans starting at or before start are read
+    def find_containing(self, start, end):
+        found = {}
+        for i in range(bisect.bisect_right(self.sorted_spans, (start, float('inf')))):
+            span = self.sorted_spans[i]
+            if span[1] >= end:
+                found.update(self.spans[span])
+        return NodeIndex.preorder(found)
+
+    # sorted by the child positions on the path from the root, which is the order a tree search yields them in. The
+    # positions among the children of a parent are computed once per call
+    @staticmethod
+    def preorder(nodes):
+        positions = {}
+
+        def path(node):
+            res = []
+            while node.parent is not None:
+                parent = node.parent
+                siblings = positions.get(parent)
+                if siblings is None:
+                    siblings = positions[parent] = {child: i for i, child in enumerate(parent.children)}
+                res.append(siblings[node])
+                node = parent
+            return res[::-1]
+        return sorted(nodes, key=path)
+
+
+# nodes of a dependency tree sorted by the start of their span, so the nodes inside a range are found by bisecting for
+# its start and reading on while they start inside it. Like a NodeIndex it is kept current by the nodes, detached nodes
+# leave the sorted lists with the start they had, so one respanned while detached is inserted at its new start when
+# it is attached again
+class SpanIndex:
+    def __init__(self, nodes=()):
+        self.starts = []
+        self.ordered = []
+        self.version = 0
+        for node in sorted(nodes, key=lambda n: n.start):
+            node.index = self
+            self.starts.append(node.start)
+            self.ordered.append(node)
+
+    def insert(self, node):
+        i = bisect.bisect_right(self.starts, node.start)
+        self.starts.insert(i, node.start)
+        self.ordered.insert(i, node)
+
+    def delete(self, node):
+        i = bisect.bisect_left(self.starts, node.start)
+        while self.ordered[i] is not node:
+            i += 1
+        del self.starts[i]
+        del self.ordered[i]
+
+    def add_subtree(self, node):
+        self.version += 1
+        for n in PreOrderIter(node):
+            n.index = self
+            self.insert(n)
+
+    def remove_subtree(self, node):
+        self.version += 1
+        for n in PreOrderIter(node):
+            self.delete(n)
+            n.index = None
+
+    # names are read from the nodes found, so a rename changes nothing here but the version
+    def rename(self, node, name):
+        self.version += 1
+
+    def respan(self, node, start, end):
+        self.version += 1
+        self.delete(node)
+        node.start = start
+        self.insert(node)
+
+    # nodes of the tree whose span lies inside [start, end]
+    def find_inside(self, start, end):
+        found = []
+        i = bisect.bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] <= end:
+            node = self.ordered[i]
+            if node.end <= end:
+                found.append(node)
+            i += 1
+        return NodeIndex.preorder(found)
+
+
+# role -> nodes, nodeType -> nodes and name -> nodes of a parse tree, built in one traversal and shared by the
+# extraction passes of FOLGenerator. The buckets are in pre-order, lookups of several keys merge them back into it,
+# so they yield what a tree search would. FOL generation only changes roles, through set_role. Moves, renames and
+# respans of the nodes bump the version of the tree's NodeIndex or SpanIndex, and a lookup after such a change
+# rebuilds the buckets first; roles assigned directly are not seen
+class TreeIndex:
+    def __init__(self, root):
+        self.root = root
+        self.build()
+
+    def build(self):
+        self.version = TreeIndex.tree_version(self.root)
+        self.order = {}
+        self.roles = {}
+        self.types = {}
+        self.names = {}
+        for node in PreOrderIter(self.root):
+            self.order[node] = len(self.order)
+            self.roles.setdefault(node.role, []).append(node)
+            self.types.setdefault(node.nodeType, []).append(node)
+            self.names.setdefault(node.name.strip(), []).append(node)
+
+    # None for a tree without a NodeIndex or SpanIndex, whose changes cannot be followed
+    @staticmethod
+    def tree_version(root):
+        return root.index.version if root.index is not None else None
+
+    def refresh(self):
+        if TreeIndex.tree_version(self.root) != self.version:
+            self.build()
+
+    # keys looked up in the bucket table named table
+    def lookup(self, table, keys):
+        self.refresh()
+        table = getattr(self, table)
+        if len(keys) == 1:
+            return list(table.get(keys[0], []))
+        return sorted([node for key in set(keys) for node in table.get(key, [])], key=self.order.get)
+
+    def find_by_role(self, *roles):
+        return self.lookup('roles', roles)
+
+    def find_by_type(self, *types):
+        return self.lookup('types', types)
+
+    # nodes whose stripped name is name
+    def find_by_name(self, name):
+        return self.lookup('names', (name,))
+
+    def set_role(self, node, role):
+        self.refresh()
+        if node in self.order:
+            self.roles[node.role].remove(node)
+            nodes = self.roles.setdefault(role, [])
+            nodes.append(node)
+            nodes.sort(key=self.order.get)
+        node.role = role
+
+
+# node of both parse trees: fixed slots instead of an attribute dict, the character span as two ints (None for
+# nodes outside the question such as FOL relations) and interned role and type strings. It keeps the parent/children
+# API of anytree nodes, so the anytree iterators, RenderTree and search work on it, and it keeps the NodeIndex of a
+# constituency tree current: its subtree enters the index when attached below an indexed node and leaves it when
+# detached, renames and set_span move it inside the index.
+# A name is a string or, for nodes of a constituency tree, a slice of the question text shared by the whole tree,
+# which is only turned into a string when it is read
+class TreeNode:
+    __slots__ = ('_name', '_text', 'nodeType', 'role', 'start', 'end', 'attributes', 'link', 'index', '_parent',
+                 '_children')
+
+    def __init__(self, parent=None, children=None, name=None, nodeType=None, role=None, start=None, end=None,
+                 attributes=None, link=None, text=None):
+        self._name = name
+        self._text = text
+        self.nodeType = sys.intern(nodeType) if nodeType is not None else None
+        self.role = sys.intern(role) if role is not None else None
+        self.start = start
+        self.end = end
+        self.attributes = attributes
+        self.link = link
+        self.index = None
+        self._parent = None
+        self._children = []
+        if parent is not None:
+            self.parent = parent
+        if children is not None:
+            self.children = children
+
+    @property
+    def name(self):
+        name = self._name
+        if name.__class__ is slice:
+            return self._text[name]
+        return name
+
+    @name.setter
+    def name(self, name):
+        if self.index is not None:
+            self.index.rename(self, name)
+        self._name = name
+
+    # the slice of the text the names of nodes joined by spaces are, if they are adjacent slices of it, else None
+    @staticmethod
+    def adjacent_slice(nodes):
+        first = nodes[0]._name
+        if first.__class__ is not slice:
+            return None
+        text = nodes[0]._text
+        stop = first.stop
+        for node in nodes[1:]:
+            name = node._name
+            if name.__class__ is not slice or node._text is not text or name.start != stop + 1 or text[stop] != ' ':
+                return None
+            stop = name.stop
+        return slice(first.start, stop)
+
+    # name.index(value) without building the name
+    def name_index(self, value):
+        name = self._name
+        if name.__class__ is slice:
+            return self._text.index(value, name.start, name.stop) - name.start
+        return name.index(value)
+
+    def set_span(self, start, end):
+        if self.index is not None:
+            self.index.respan(self, start, end)
+        self.start = start
+        self.end = end
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        if parent is self._parent:
+            return
+        node = parent
+        while node is not None:
+            if node is self:
+                raise LoopError('Cannot set parent. {0!r} is parent of {1!r}.'.format(self, parent))
+            node = node._parent
+        if self._parent is not None:
+            self._parent._children.remove(self)
+            self._parent = None
+            if self.index is not None:
+                self.index.remove_subtree(self)
+        if parent is not None:
+            parent._children.append(self)
+            self._parent = parent
+            if parent.index is not None:
+                parent.index.add_subtree(self)
+
+    @property
+    def children(self):
+        return tuple(self._children)
+
+    @children.setter
+    def children(self, children):
+        children = tuple(children)
+        if len(set(map(id, children))) != len(children):
+            raise TreeError('Cannot add a node multiple times as child.')
+        for child in self.children:
+            child.parent = None
+        for child in children:
+            child.parent = self
+
+    @property
+    def siblings(self):
+        if self._parent is None:
+            return ()
+        return tuple(node for node in self._parent._children if node is not self)
+
+    @property
+    def ancestors(self):
+        res = []
+        node = self._parent
+        while node is not None:
+            res.append(node)
+            node = node._parent
+        return tuple(reversed(res))
+
+    @property
+    def depth(self):
+        depth = 0
+        node = self._parent
+        while node is not None:
+            depth += 1
+            node = node._parent
+        return depth
+
+    @property
+    def root(self):
+        node = self
+        while node._parent is not None:
+            node = node._parent
+        return node
+
+    @property
+    def is_root(self):
+        return self._parent is None
+
+    @property
+    def is_leaf(self):
+        return len(self._children) == 0
+
+    def __repr__(self):
+        fields = [('attributes', self.attributes), ('end', self.end), ('link', self.link), ('name', self.name),
+                  ('nodeType', self.nodeType), ('role', self.role), ('start', self.start)]
+        return 'TreeNode({0})'.format(', '.join('{0}={1!r}'.format(k, v) for k, v in fields if v is not None))
 
 
 class PlaceQuestionParseTree:
@@ -20,27 +406,42 @@ class PlaceQuestionParseTree:
 
     def __init__(self, parse_dict):
         self.parse_dict = parse_dict
+        self.text = parse_dict['word']
         self.tree = None
         self.root = None
+        self.index = NodeIndex(self.text)
         self.construct_tree()
 
     def construct_tree(self):
-        root = AnyNode(name=self.parse_dict['word'], nodeType=self.parse_dict['nodeType'], role='',
-                       spans={'start': 0, 'end': len(self.parse_dict['word'])})
+        root = TreeNode(name=slice(0, len(self.text)), text=self.text, nodeType=self.parse_dict['nodeType'], role='',
+                        start=0, end=len(self.text))
         if 'children' in self.parse_dict.keys():
+            position = 0
             for child in self.parse_dict['children']:
-                self.add_to_tree(child, root)
+                position = self.add_to_tree(child, root, position) + 1
+        self.index.add_subtree(root)
         self.root = root
         self.tree = RenderTree(root)
 
-    def add_to_tree(self, node, parent):
-        local_start = parent.name.find(node['word'])
-        n = AnyNode(name=node['word'], nodeType=node['nodeType'], parent=parent, role='',
-                    spans={'start': parent.spans['start'] + local_start,
-                           'end': parent.spans['start'] + local_start + len(node['word'])})
+    # the words of a node's children follow each other in its word, separated by a space, so a node starts where
+    # its previous sibling ended (a parse not laid out like this falls back to searching the parent's name). Returns
+    # where the node ends. A word repeated inside a phrase thus gets the span of its own occurrence, where searching
+    # the parent's name gave every repetition the span of the first one (e.g. the second 'river' in 'the river north
+    # of the river'), so labels of repeated words can now differ in their start
+    def add_to_tree(self, node, parent, start):
+        word = node['word']
+        if self.text.startswith(word, start):
+            name = slice(start, start + len(word))
+        else:
+            start = parent.start + parent.name.find(word)
+            name = word
+        n = TreeNode(name=name, text=self.text, nodeType=node['nodeType'], parent=parent, role='', start=start,
+                     end=start + len(word))
         if 'children' in node.keys():
+            position = start
             for child in node['children']:
-                self.add_to_tree(child, n)
+                position = self.add_to_tree(child, n, position) + 1
+        return n.end
 
     def render(self):
         self.tree = RenderTree(self.root)
@@ -62,13 +463,13 @@ class PlaceQuestionParseTree:
         return res
 
     def find_node_by_exact_name(self, string):
-        return search.findall_by_attr(self.root, string)
+        return self.index.find_by_name(string)
 
     def find_node_by_name(self, string):
         res = self.find_node_by_exact_name(string)
         if len(res) > 0:
             return res
-        return search.findall(self.root, filter_=lambda node: node.name in string.split())
+        return self.index.find_by_name(*string.split())
 
     def label_role(self, name, role, clean=False, question_words=False, comparison=False):
         nodes = self.find_node_by_name(name)
@@ -88,7 +489,7 @@ class PlaceQuestionParseTree:
                 else:
                     node.parent = None
                 selected.name = name
-                selected.spans = {'start': self.root.name.index(name), 'end': self.root.name.index(name) + len(name)}
+                selected.set_span(self.root.name_index(name), self.root.name_index(name) + len(name))
                 if question_words:
                     selected.nodeType = 'WH'
                 elif comparison:
@@ -117,9 +518,9 @@ class PlaceQuestionParseTree:
                         sibling.name in PlaceQuestionParseTree.spatiotemporal_propositions:
                     if named_object.role == 'd':
                         sibling.role = 'r'
-                        if sibling.name + '--' + str(sibling.spans['start']) not in res_relationships.keys():
-                            res_relationships[sibling.name + '--' + str(sibling.spans['start'])] = {
-                                'start': sibling.spans['start'], 'end': sibling.spans['end'], 'role': 'r', 'pos': 'ADP'}
+                        if sibling.name + '--' + str(sibling.start) not in res_relationships.keys():
+                            res_relationships[sibling.name + '--' + str(sibling.start)] = {
+                                'start': sibling.start, 'end': sibling.end, 'role': 'r', 'pos': 'ADP'}
                     else:  # complex spatial relationship with ['of', 'from', 'to']
                         sibling.role = 'R'
                         if sibling.name in ['of', 'to', 'from']:
@@ -136,17 +537,13 @@ class PlaceQuestionParseTree:
                                         'pos': 'ADP'}
                                     self.label_complex_spatial_relationships(sibling, pattern)
                                 else:
-                                    if sibling.name + '--' + str(
-                                            sibling.spans['start']) not in res_relationships.keys():
-                                        res_relationships[sibling.name + '--' + str(sibling.spans['start'])
-                                                          ] = {'start': sibling.spans['start'],
-                                                               'end': sibling.spans['end'],
-                                                               'role': 'R', 'pos': 'ADP'}
+                                    if sibling.name + '--' + str(sibling.start) not in res_relationships.keys():
+                                        res_relationships[sibling.name + '--' + str(sibling.start)] = {
+                                            'start': sibling.start, 'end': sibling.end, 'role': 'R', 'pos': 'ADP'}
                         else:
-                            if sibling.name + '--' + str(sibling.spans['start']) not in res_relationships.keys():
-                                res_relationships[sibling.name + '--' + str(sibling.spans['start'])
-                                                  ] = {'start': sibling.spans['start'],
-                                                       'end': sibling.spans['end'], 'role': 'R', 'pos': 'ADP'}
+                            if sibling.name + '--' + str(sibling.start) not in res_relationships.keys():
+                                res_relationships[sibling.name + '--' + str(sibling.start)] = {
+                                    'start': sibling.start, 'end': sibling.end, 'role': 'R', 'pos': 'ADP'}
                     named_object.parent.role = 'LOCATION'
         return res_relationships
 
@@ -179,16 +576,15 @@ class PlaceQuestionParseTree:
                 context.role = 'R'
             else:
                 nodes = PlaceQuestionParseTree.iterate_and_find(context, text)
-                new_node = AnyNode(name=text, nodeType='IN', role='R', spans={'start': nodes[0].spans['start'],
-                                                                              'end': nodes[len(nodes) - 1].spans[
-                                                                                  'end']})
+                new_node = TreeNode(name=text, nodeType='IN', role='R', start=nodes[0].start,
+                                    end=nodes[len(nodes) - 1].end, text=self.text)
                 before = []
                 after = []
 
                 firstparent = nodes[0].parent
                 if firstparent != context:
                     for child in context.children:
-                        if self.root.name.index(child.name) + len(child.name) <= self.root.name.index(text):
+                        if self.root.name_index(child.name) + len(child.name) <= self.root.name_index(text):
                             before.append(child)
 
                 for child in firstparent.children:
@@ -203,7 +599,7 @@ class PlaceQuestionParseTree:
                 while lastparent != context:
                     lastparent = lastparent.parent
                     for child in lastparent.children:
-                        if self.root.name.index(text) + len(text) <= self.root.name.index(child.name):
+                        if self.root.name_index(text) + len(text) <= self.root.name_index(child.name):
                             after.append(child)
                 context.children = []
                 for b in before:
@@ -229,8 +625,7 @@ class PlaceQuestionParseTree:
         return res
 
     def label_complex_comparison(self, reg_results, comparison, role):
-        contexts = search.findall(self.root, filter_=lambda node: node.spans['start'] <= reg_results.regs[0][0] and
-                                                                  node.spans['end'] >= reg_results.regs[0][1])
+        contexts = self.index.find_containing(reg_results.regs[0][0], reg_results.regs[0][1])
         context = None
         vals = comparison.split()
         max_depth = -1
@@ -250,7 +645,7 @@ class PlaceQuestionParseTree:
             second.parent.name = second.parent.name.replace(second.name, '').strip()
             second.parent = None
             first.parent.name = first.parent.name + ' ' + second.name
-            first.parent.spans = {'start': first.parent.spans['start'], 'end': second.spans['end']}
+            first.parent.set_span(first.parent.start, second.end)
         first.name = comparison
         first.role = role
 
@@ -258,12 +653,12 @@ class PlaceQuestionParseTree:
         named_objects = search.findall(self.root, filter_=lambda node: node.role == 'LOCATION')
         if len(named_objects) == 2:
             if named_objects[0].depth < named_objects[1].depth:
-                if self.root.name.index(named_objects[0].name) < self.root.name.index(named_objects[1].name):
+                if self.root.name_index(named_objects[0].name) < self.root.name_index(named_objects[1].name):
                     PlaceQuestionParseTree.merge(node1=named_objects[0], node2=named_objects[1])
                 else:
                     PlaceQuestionParseTree.merge(node1=named_objects[0], node2=named_objects[1], order=False)
             else:
-                if self.root.name.index(named_objects[0].name) < self.root.name.index(named_objects[1].name):
+                if self.root.name_index(named_objects[0].name) < self.root.name_index(named_objects[1].name):
                     PlaceQuestionParseTree.merge(node1=named_objects[1], node2=named_objects[0], order=False)
                 else:
                     PlaceQuestionParseTree.merge(node1=named_objects[1], node2=named_objects[0])
@@ -279,7 +674,7 @@ class PlaceQuestionParseTree:
                 node.children[0].parent = None
                 node.children = children
             except:
-                print('error in cleaning...')
+                logging.warning('error in cleaning...')
 
         incorrect_types = search.findall(self.root, filter_=lambda node: len(node.children) > 0 and
                                                                          node.role in ['p', 'P'])
@@ -290,14 +685,13 @@ class PlaceQuestionParseTree:
     @staticmethod
     def merge(node1, node2, order=True):
         node = None
-        start = min(node1.spans['start'], node2.spans['start'])
-        end = max(node1.spans['end'], node2.spans['end'])
-        if order:
-            node = AnyNode(name=node1.name + ' ' + node2.name, nodeType=node1.nodeType, role=node1.role,
-                           spans={'start': start, 'end': end})
-        else:
-            node = AnyNode(name=node2.name + ' ' + node1.name, nodeType=node1.nodeType, role=node1.role,
-                           spans={'start': start, 'end': end})
+        start = min(node1.start, node2.start)
+        end = max(node1.end, node2.end)
+        first, second = (node1, node2) if order else (node2, node1)
+        name = TreeNode.adjacent_slice([first, second])
+        if name is None:
+            name = first.name + ' ' + second.name
+        node = TreeNode(name=name, text=first._text, nodeType=node1.nodeType, role=node1.role, start=start, end=end)
         node.parent = node1.parent
         if order:
             node1.parent = node
@@ -306,14 +700,16 @@ class PlaceQuestionParseTree:
             node2.parent = node
             node1.parent = node
 
+    # inner nodes are renamed to the names of their children joined by spaces; while these are adjacent slices of the
+    # text the new name is a slice as well, so a node costs no string building
     def update(self):
         for node in PostOrderIter(self.root):
             if len(node.children) > 0:
-                name = ''
-                for child in node.children:
-                    name += child.name + ' '
-                if node.name != name:
-                    node.name = name.strip()
+                name = TreeNode.adjacent_slice(node.children)
+                if name is None:
+                    node.name = ' '.join(child.name for child in node.children).strip()
+                elif name != node._name:
+                    node.name = name
                 if len(node.children) == 1 and (node.role == '' or node.role == node.children[0].role) and \
                         node.nodeType == node.children[0].nodeType:
                     node.role = node.children[0].role
@@ -338,15 +734,11 @@ class PlaceQuestionParseTree:
                 if all_objects:
                     parent.role = 'o'
                     parent.children = []
-                    res[parent.name + '--' + str(parent.spans['start'])] = {'start': parent.spans['start'],
-                                                                            'end': parent.spans['end'],
-                                                                            'role': 'o',
-                                                                            'pos': 'NOUN'}
+                    res[parent.name + '--' + str(parent.start)] = {'start': parent.start, 'end': parent.end,
+                                                                   'role': 'o', 'pos': 'NOUN'}
                 else:
-                    res[npo.name + '--' + str(npo.spans['start'])] = {'start': npo.spans['start'],
-                                                                      'end': npo.spans['end'],
-                                                                      'role': npo.role,
-                                                                      'pos': 'NOUN'}
+                    res[npo.name + '--' + str(npo.start)] = {'start': npo.start, 'end': npo.end, 'role': npo.role,
+                                                             'pos': 'NOUN'}
         return res
 
     def get_verbs(self):
@@ -366,11 +758,10 @@ class PlaceQuestionParseTree:
             decision = decisions[i]
             if decision != 'u':
                 node.role = decision
-                res[node.name + '--' + str(node.spans['start'])] = {'start': node.spans['start'],
-                                                                    'end': node.spans['end'],
-                                                                    'role': node.role, 'pos': 'VERB'}
+                res[node.name + '--' + str(node.start)] = {'start': node.start, 'end': node.end, 'role': node.role,
+                                                           'pos': 'VERB'}
             else:
-                print("this verb is suspicious: " + str(node.name))
+                logging.debug("this verb is suspicious: " + str(node.name))
         situations = search.findall(self.root, filter_=lambda node: node.role == 's')
         for situation in situations:
             for sibiling in situation.siblings:
@@ -416,19 +807,16 @@ class PlaceQuestionParseTree:
         for node in nodes:
             if node.name in ['and', 'both']:
                 node.role = '&'
-                res[node.name + '--' + str(node.spans['start'])] = {'start': node.spans['start'],
-                                                                    'end': node.spans['end'], 'role': node.role,
-                                                                    'pos': 'CCONJ'}
+                res[node.name + '--' + str(node.start)] = {'start': node.start, 'end': node.end, 'role': node.role,
+                                                           'pos': 'CCONJ'}
             elif node.name in ['or', 'whether']:
                 node.role = '|'
-                res[node.name + '--' + str(node.spans['start'])] = {'start': node.spans['start'],
-                                                                    'end': node.spans['end'], 'role': node.role,
-                                                                    'pos': 'CCONJ'}
+                res[node.name + '--' + str(node.start)] = {'start': node.start, 'end': node.end, 'role': node.role,
+                                                           'pos': 'CCONJ'}
             elif node.name in ['not', 'neither', 'nor', 'but', 'except']:
                 node.role = '!'
-                res[node.name + '--' + str(node.spans['start'])] = {'start': node.spans['start'],
-                                                                    'end': node.spans['end'], 'role': node.role,
-                                                                    'pos': 'SCONJ'}
+                res[node.name + '--' + str(node.start)] = {'start': node.start, 'end': node.end, 'role': node.role,
+                                                           'pos': 'SCONJ'}
 
             siblings = search.findall(node.parent, filter_=lambda node: node.role not in ('&', '|', '!', 'q') and
                                                                         node.nodeType != 'DT' and (
@@ -437,8 +825,8 @@ class PlaceQuestionParseTree:
             for sibling in siblings:
                 if sibling.nodeType == ',':
                     sibling.role = node.role
-                    res[sibling.name + '--' + str(sibling.spans['start'])] = {
-                        'start': sibling.spans['start'], 'end': sibling.spans['end'], 'role': sibling.role,
+                    res[sibling.name + '--' + str(sibling.start)] = {
+                        'start': sibling.start, 'end': sibling.end, 'role': sibling.role,
                         'pos': res[node.name]['pos']}
                 else:
                     sibling_roles.add(sibling.role)
@@ -461,9 +849,9 @@ class PlaceQuestionParseTree:
                     if num.parent.role == '':
                         num.parent.role = 'MEASURE'
                     if num.name + ' ' + sibling.name in self.root.name:
-                        units[num.name + ' ' + sibling.name + '--' + str(num.spans['start'])] = {
-                            'start': num.spans['start'],
-                            'end': sibling.spans['end'] + 1,
+                        units[num.name + ' ' + sibling.name + '--' + str(num.start)] = {
+                            'start': num.start,
+                            'end': sibling.end + 1,
                             'role': 'n',
                             'pos': 'NUM'}
                         added = True
@@ -473,25 +861,19 @@ class PlaceQuestionParseTree:
                     if child == num.parent:
                         found = True
                     elif found and child.name in PlaceDependencyTree.UNITS:
-                        new_node = AnyNode(child.parent, role='MEASURE', name=num.name + ' ' + child.name,
-                                           nodeType='NP', spans={
-                                'start': self.root.name.index(num.name + ' ' + child.name),
-                                'end': self.root.name.index(num.name + ' ' + child.name) +
-                                       len(num.name + ' ' + child.name)
-                            })
+                        new_node = TreeNode(child.parent, role='MEASURE', name=num.name + ' ' + child.name,
+                                            nodeType='NP', text=self.text,
+                                            start=self.root.name_index(num.name + ' ' + child.name),
+                                            end=self.root.name_index(num.name + ' ' + child.name) +
+                                            len(num.name + ' ' + child.name))
                         num.parent = new_node
                         child.parent = new_node
-                        units[new_node.name + '--' + str(new_node.spans['start'])] = {'start': new_node.spans['start'],
-                                                                                      'end': new_node.spans['end'],
-                                                                                      'role': 'n',
-                                                                                      'pos': 'NUM'
-                                                                                      }
+                        units[new_node.name + '--' + str(new_node.start)] = {'start': new_node.start,
+                                                                             'end': new_node.end, 'role': 'n',
+                                                                             'pos': 'NUM'}
             else:
-                units[num.name + '--' + str(num.spans['start'])] = {'start': num.spans['start'],
-                                                                    'end': num.spans['end'],
-                                                                    'role': 'n',
-                                                                    'pos': 'NUM'
-                                                                    }
+                units[num.name + '--' + str(num.start)] = {'start': num.start, 'end': num.end, 'role': 'n',
+                                                           'pos': 'NUM'}
         return units
 
     def label_qualities(self):
@@ -526,11 +908,11 @@ class PlaceQuestionParseTree:
                 elif child.role in ['p', 'P']:
                     adj.role = 'Q'
                 else:
-                    print('unresolved adjective! ' + adj.name + ' ' + child.name)
+                    logging.warning('unresolved adjective! ' + adj.name + ' ' + child.name)
                 # if ' ' in adj.name:
-                compounds[adj.name + '--' + str(adj.spans['start'])] = {'start': adj.spans['start'],
-                                                                        'end': adj.spans['end'],
-                                                                        'role': adj.role, 'pos': 'ADJ'}
+                compounds[adj.name + '--' + str(adj.start)] = {'start': adj.start,
+                                                               'end': adj.end,
+                                                               'role': adj.role, 'pos': 'ADJ'}
                 break
             elif found and child.nodeType in ['PP', 'IN']:
                 if child.nodeType == 'IN':
@@ -538,34 +920,34 @@ class PlaceQuestionParseTree:
                     child.name = adj.name + ' ' + child.name
                     if child.name.endswith('than'):
                         child.role = '<>'
-                        compounds[child.name + '--' + str(child.spans['start'])] = {'start': child.spans['start'],
-                                                                                    'end': child.spans['end'],
-                                                                                    'role': child.role, 'pos': 'ADJ'}
+                        compounds[child.name + '--' + str(child.start)] = {'start': child.start,
+                                                                           'end': child.end,
+                                                                           'role': child.role, 'pos': 'ADJ'}
                 elif child.nodeType == 'PP' and child.children[0].nodeType == 'IN':
                     if adj.parent is not None and len(adj.parent.children) == 2:
                         child.parent = adj.parent
                         child.name = adj.name + ' ' + child.name
-                        child.spans = {'start': adj.spans['start'], 'end': child.spans['end']}
+                        child.set_span(adj.start, child.end)
                         adj.parent = None
                         child.children[0].name = adj.name + ' ' + child.children[0].name
-                        child.children[0].spans = {'start': adj.spans['start'], 'end': child.children[0].spans['end']}
+                        child.children[0].set_span(adj.start, child.children[0].end)
                         if child.children[0].name.endswith('than'):
                             child.children[0].role = '<>'
-                            compounds[child.children[0].name + '--' + str(child.children[0].spans['start'])] = {
-                                'start': child.children[0].spans['start'], 'end': child.children[0].spans['end'],
+                            compounds[child.children[0].name + '--' + str(child.children[0].start)] = {
+                                'start': child.children[0].start, 'end': child.children[0].end,
                                 'role': child.children[0].role, 'pos': 'ADJ'}
                     else:
                         adj.parent = None
                         child.children[0].name = adj.name + ' ' + child.children[0].name
-                        child.children[0].spans = {'start': adj.spans['start'], 'end': child.children[0].spans['end']}
+                        child.children[0].set_span(adj.start, child.children[0].end)
                         if child.children[0].name.endswith('than'):
                             child.children[0].role = '<>'
-                            compounds[child.children[0].name + '--' + str(child.children[0].spans['start'])] = {
-                                'start': child.children[0].spans['start'],
-                                'end': child.children[0].spans['end'],
+                            compounds[child.children[0].name + '--' + str(child.children[0].start)] = {
+                                'start': child.children[0].start,
+                                'end': child.children[0].end,
                                 'role': child.children[0].role, 'pos': 'ADJ'}
                 else:
-                    print('unresolved adjective ' + adj.name + ' ' + child.name)
+                    logging.warning('unresolved adjective ' + adj.name + ' ' + child.name)
         return compounds
 
     @staticmethod
@@ -728,6 +1110,8 @@ class FOLGenerator:
     def __init__(self, cons_tree, dep_tree):
         self.cons = cons_tree
         self.dep = dep_tree
+        self.cons_index = TreeIndex(cons_tree.root)
+        self.dep_index = TreeIndex(dep_tree.root)
         self.dependencies = {}
         self.variables = {}
         self.constants = []
@@ -750,34 +1134,34 @@ class FOLGenerator:
         return self.dependencies
 
     def declare(self):
-        specifics = search.findall(self.dep.root, filter_=lambda node: node.role in ['P', 'E', 'd'])
+        specifics = self.dep_index.find_by_role('P', 'E', 'd')
         for node in specifics:
             first = PlaceDependencyTree.clone_node_without_children(node)
             self.constants.append(node.name)
-            relation = AnyNode(name='DECLARE', spans=[{}], attributes=None, link='IS', nodeType='RELATION')
-            second = AnyNode(name=FOLGenerator.CONCEPTS[node.role], spans=[{}], attributes=None,
-                             link=node.name, nodeType='CONCEPT')
+            relation = TreeNode(name='DECLARE', attributes=None, link='IS', nodeType='RELATION')
+            second = TreeNode(name=FOLGenerator.CONCEPTS[node.role], attributes=None,
+                              link=node.name, nodeType='CONCEPT')
             self.dependencies['declaration'].append(Dependency(first, relation, second))
 
         var_id = 0
-        generics = search.findall(self.dep.root, filter_=lambda node: node.role in ['p', 'o', 'e'])
+        generics = self.dep_index.find_by_role('p', 'o', 'e')
         for generic in generics:
             first = PlaceDependencyTree.clone_node_without_children(generic)
-            relation = AnyNode(name='DECLARE', spans=[{}], attributes=None, link='IS', nodeType='RELATION')
-            second = AnyNode(name='x' + str(var_id), spans=[{}], attributes=None,
-                             link=PlaceDependencyTree.preprocess_names(generic.name), nodeType='VARIABLE')
+            relation = TreeNode(name='DECLARE', attributes=None, link='IS', nodeType='RELATION')
+            second = TreeNode(name='x' + str(var_id), attributes=None,
+                              link=PlaceDependencyTree.preprocess_names(generic.name), nodeType='VARIABLE')
             self.dependencies['declaration'].append(Dependency(first, relation, second))
             self.variables[first.name] = 'x' + str(var_id)
             var_id += 1
 
     def extract_intent_dependency(self):
-        question_words = search.findall(self.cons.root, filter_=lambda node: node.nodeType == 'WH')
+        question_words = self.cons_index.find_by_type('WH')
         selected = None
         if len(question_words) > 1:
             min_start = 1000
             for node in question_words:
-                if node.spans['start'] < min_start:
-                    min_start = node.spans['start']
+                if node.start < min_start:
+                    min_start = node.start
                     selected = node
         elif len(question_words) == 1:
             selected = question_words[0]
@@ -785,15 +1169,14 @@ class FOLGenerator:
             return None
         first = PlaceDependencyTree.clone_node_without_children(selected, cons_tree=True)
         if selected.role == '8':
-            relation = AnyNode(name='INTENT', spans=[{}], attributes=None, link='IS/ARE', nodeType='RELATION')
+            relation = TreeNode(name='INTENT', attributes=None, link='IS/ARE', nodeType='RELATION')
             intent = Dependency(node1=first, relation=relation)
             return [intent]
 
-        seconds = search.findall(self.cons.root, filter_=lambda node: node.role in ['o', 'p',
-                                                                                    'ACTION', 'EVENT', 'SITUATION'])
+        seconds = self.cons_index.find_by_role('o', 'p', 'ACTION', 'EVENT', 'SITUATION')
         what = None
         if len(seconds) == 0:
-            seconds = search.findall(self.cons.root, filter_=lambda node: node.role == 'P')
+            seconds = self.cons_index.find_by_role('P')
 
         if len(seconds) == 1:
             what = seconds[0]
@@ -801,42 +1184,52 @@ class FOLGenerator:
             max_depth = -1
             min_start = 1000
             for second in seconds:
-                if second.spans['start'] < min_start:
+                if second.start < min_start:
                     if second.role == 'P' and (selected.nodeType.startswith('WH') or
                                                second.parent.nodeType != 'PP'):
                         continue
                     else:
                         what = second
-                        min_start = second.spans['start']
+                        min_start = second.start
                         max_depth = second.depth
-                elif second.spans['start'] == min_start and second.depth > max_depth:
+                elif second.start == min_start and second.depth > max_depth:
                     what = second
                     max_depth = second.depth
         if what is None:
             what = seconds[0]
         second = PlaceDependencyTree.clone_node_without_children(what, cons_tree=True)
         if selected.role == '1':  # where questions
-            relation = AnyNode(name='INTENT', spans=[{}], attributes=None, link='LOCATION', nodeType='RELATION')
+            relation = TreeNode(name='INTENT', attributes=None, link='LOCATION', nodeType='RELATION')
         elif selected.role == '6':  # how many
-            relation = AnyNode(name='INTENT', spans=[{}], attributes=None, link='COUNT', nodeType='RELATION')
+            relation = TreeNode(name='INTENT', attributes=None, link='COUNT', nodeType='RELATION')
         else:
             if ' ' in first.name:
                 first.name = first.name.split()[1]
-            relation = AnyNode(name='INTENT', spans=[{}], attributes=None, link=first.name.upper(), nodeType='RELATION')
+            relation = TreeNode(name='INTENT', attributes=None, link=first.name.upper(), nodeType='RELATION')
         intent = Dependency(node1=first, relation=relation, node2=second)
         return [intent]
 
     def print_dependencies(self):
+        str_deps = self.format_dependencies()
+        print(str_deps)
+        return str_deps
+
+    def format_dependencies(self):
         str_deps = ''
         for k, v in self.dependencies.items():
-            print(k)
             str_deps += k + '\n'
-            print('value: \n' + str(v))
             str_deps += str(v) + '\n'
-
         return str_deps
 
     def print_logical_form(self):
+        logical_form = self.format_logical_form()
+        print(logical_form)
+        print()
+        return logical_form
+
+    # the FOL statement of the dependencies; completes the intents and criteria with their conjunctions, so it is
+    # built once
+    def format_logical_form(self):
         # intent
         logical_form = ''
         intent = self.dependencies['intent'][0]
@@ -887,9 +1280,6 @@ class FOLGenerator:
 
         for key, var in self.variables.items():
             logical_form = logical_form.replace(key, var)
-
-        print(logical_form)
-        print()
         return logical_form
 
     def generate_FOL_criterion(self, criterion, logical_form, last=False):
@@ -998,9 +1388,9 @@ class FOLGenerator:
         self.dependencies['criteria'].extend(new_criteria)
 
     def extract_comparisons(self):
-        comps = search.findall(self.cons.root, filter_=lambda node: node.role in ['>', '<', '<>', '=', '>=', '<='])
+        comps = self.cons_index.find_by_role('>', '<', '<>', '=', '>=', '<=')
         for comp in comps:
-            d_comp = search.findall(self.dep.root, filter_=lambda node: node.name.strip() == comp.name.strip())
+            d_comp = self.dep_index.find_by_name(comp.name.strip())
             if len(d_comp) != 1:
                 continue
             d_comp = d_comp[0]
@@ -1035,7 +1425,7 @@ class FOLGenerator:
             self.dependencies['criteria'].append(Dependency(first, relation, second))
 
     def extract_situations(self):
-        situations = search.findall(self.dep.root, filter_=lambda node: node.role == 's')
+        situations = self.dep_index.find_by_role('s')
         for situation in situations:
             first = None
             second = None
@@ -1054,8 +1444,8 @@ class FOLGenerator:
                             first = PlaceDependencyTree.clone_node_without_children(nsubjects[1])
                             second = PlaceDependencyTree.clone_node_without_children(nsubjects[0])
                         if first is not None and second is not None:
-                            relation = AnyNode(name='in', spans=[{}], attributes=None, link='prep', role='R',
-                                               nodeType='dep')
+                            relation = TreeNode(name='in', attributes=None, link='prep', role='R',
+                                                nodeType='dep')
                     # situation + object (attribute) + place
                     elif (nsubjects[0].role in ['P', 'p'] and nsubjects[1].role in ['o']) or \
                             (nsubjects[1].role in ['P', 'p'] and nsubjects[0].role in ['o']):
@@ -1072,8 +1462,8 @@ class FOLGenerator:
                         else:
                             first = PlaceDependencyTree.clone_node_without_children(dobjs[0])
                             second = PlaceDependencyTree.clone_node_without_children(nsubjects[0])
-                            relation = AnyNode(name='in', spans=[{}], attributes=None, link='prep', role='R',
-                                               nodeType='dep')
+                            relation = TreeNode(name='in', attributes=None, link='prep', role='R',
+                                                nodeType='dep')
                     elif len(dobjs) == 0 and situation.parent is not None and situation.parent.role == 'o':
                         first = PlaceDependencyTree.clone_node_without_children(nsubjects[0])
                         second = PlaceDependencyTree.clone_node_without_children(situation.parent)
@@ -1099,10 +1489,10 @@ class FOLGenerator:
                             second = PlaceDependencyTree.clone_node_without_children(objects[0])
                             relation = PlaceDependencyTree.clone_node_without_children(situation)
             elif situation.name in ['border', 'borders', 'cross', 'crosses', 'flow', 'flows', 'discharge', 'discharges']:
-                relation = AnyNode(name=situation.name, spans=[{}], attributes=None, link='prep', role='R',
-                                   nodeType='dep')
-                generic_places = search.findall(self.dep.root, filter_=lambda node: node.role == 'p')
-                specific_places = search.findall(self.dep.root, filter_=lambda node: node.role == 'P')
+                relation = TreeNode(name=situation.name, attributes=None, link='prep', role='R',
+                                    nodeType='dep')
+                generic_places = self.dep_index.find_by_role('p')
+                specific_places = self.dep_index.find_by_role('P')
                 if len(generic_places) == 2:
                     first = PlaceDependencyTree.clone_node_without_children(generic_places[0])
                     second = PlaceDependencyTree.clone_node_without_children(generic_places[1])
@@ -1124,7 +1514,7 @@ class FOLGenerator:
                 self.dependencies['criteria'].append(Dependency(first, relation, second))
 
     def extract_quality_relations(self):
-        qualities = search.findall(self.cons.root, filter_=lambda node: node.role in ['Q', 'q'])
+        qualities = self.cons_index.find_by_role('Q', 'q')
         quality_map = {'Q': ['p', 'P'], 'q': ['e', 'E', 'o']}
         for q in qualities:
             reference = search.findall(q.parent, filter_=lambda node: node.parent == q.parent and
@@ -1132,7 +1522,7 @@ class FOLGenerator:
             if len(reference) == 0:
                 continue
             reference = reference[0]
-            d_q = search.findall(self.dep.root, filter_=lambda node: node.name.strip() == q.name.strip())
+            d_q = self.dep_index.find_by_name(q.name.strip())
             if len(d_q) != 1:
                 continue
             d_q = d_q[0]
@@ -1140,22 +1530,22 @@ class FOLGenerator:
             node.nodeType in ['RBS', 'JJS'])) > 0:
                 first = PlaceDependencyTree.clone_node_without_children(reference, cons_tree=True)
                 second = PlaceDependencyTree.clone_node_without_children(d_q)
-                relation = AnyNode(name='IS/ARE', spans=[{}], attributes=None, link='SUPERLATIVE',
-                                   nodeType='RELATION')
+                relation = TreeNode(name='IS/ARE', attributes=None, link='SUPERLATIVE',
+                                    nodeType='RELATION')
                 self.dependencies['criteria'].append(Dependency(first, relation, second))
             elif q.role == 'JJR' or len(q.children) > 0 and len(search.findall(q, filter_=lambda node:
             node.nodeType in ['RBR', 'JJR'])) > 0:
-                print('Comparative')
+                logging.debug('Comparative')
             else:
                 first = PlaceDependencyTree.clone_node_without_children(reference, cons_tree=True)
                 second = PlaceDependencyTree.clone_node_without_children(d_q)
-                relation = AnyNode(name='IS/ARE', spans=[{}], attributes=None, link='PROPERTY',
-                                   nodeType='RELATION')
+                relation = TreeNode(name='IS/ARE', attributes=None, link='PROPERTY',
+                                    nodeType='RELATION')
                 self.dependencies['criteria'].append(Dependency(first, relation, second))
 
     def extract_conjunctions(self):
         and_or = ['&', '|']
-        conjs = search.findall(self.cons.root, filter_=lambda node: node.role in and_or)
+        conjs = self.cons_index.find_by_role(*and_or)
         for conj in conjs:
             siblings = search.findall(conj.parent, filter_=lambda node: node.parent == conj.parent and
                                                                         node.role in ['p', 'P', 'e', 'E'])
@@ -1170,30 +1560,29 @@ class FOLGenerator:
                         rel_name = FOLGenerator.SPECIAL_CHARS['and']
                         if conj.role == '|':
                             rel_name = FOLGenerator.SPECIAL_CHARS['or']
-                        relation = AnyNode(name=rel_name, spans=[{}], attributes=None, link='AND/OR',
-                                           nodeType='RELATION')
+                        relation = TreeNode(name=rel_name, attributes=None, link='AND/OR',
+                                            nodeType='RELATION')
                         self.dependencies['criteria'].append(Dependency(first, relation, second))
         not_nor = ['!']
-        negations = search.findall(self.cons.root, filter_=lambda node: node.role in not_nor)
+        negations = self.cons_index.find_by_role(*not_nor)
         for negation in negations:
             next = search.findall(negation.parent, filter_=lambda node: node.parent == negation.parent and
-                                                                        node.spans['start'] > negation.spans[
-                                                                            'start'] and node.role in ['p', 'P', 'e',
-                                                                                                       'E'])
+                                                                        node.start > negation.start and
+                                                                        node.role in ['p', 'P', 'e', 'E'])
             if len(next) > 0:
                 next = next[0]
-                d_conj = search.findall(self.dep.root, filter_=lambda node: node.name.strip() == negation.name.strip())
+                d_conj = self.dep_index.find_by_name(negation.name.strip())
                 if len(d_conj) == 1:
                     d_conj = d_conj[0]
                     if d_conj.parent.role in ['p', 'e']:
                         first = PlaceDependencyTree.clone_node_without_children(d_conj.parent)
                         second = PlaceDependencyTree.clone_node_without_children(next, cons_tree=True)
-                        relation = AnyNode(name=negation.name.upper(), spans=[{}], attributes=None, link='NOT',
-                                           nodeType='RELATION')
+                        relation = TreeNode(name=negation.name.upper(), attributes=None, link='NOT',
+                                            nodeType='RELATION')
                         self.dependencies['criteria'].append(Dependency(first, relation, second))
 
     def extract_spatiotemporal_relationships(self):
-        locations = search.findall(self.cons.root, filter_=lambda node: node.role == 'LOCATION')
+        locations = self.cons_index.find_by_role('LOCATION')
         for location in locations:
             done = False
             relationships = search.findall(location, filter_=lambda node: node.parent == location and
@@ -1209,16 +1598,13 @@ class FOLGenerator:
                 continue
             else:
                 relationship = relationships[0]
-                r_nodes = search.findall(self.dep.root, filter_=lambda node: node.name.strip() == relationship.name and
-                                                                             node.spans[0]['start'] >=
-                                                                             relationship.spans['start'] - 2
-                                                                             and node.spans[0]['end'] <=
-                                                                             relationship.spans['end'] + 3)
+                r_nodes = [node for node in self.dep_index.find_by_name(relationship.name)
+                           if node.start >= relationship.start - 2 and node.end <= relationship.end + 3]
                 if len(r_nodes) != 1:
                     continue
                 r_node = r_nodes[0]
-                subjects = search.findall(self.dep.root, filter_=lambda node: node.role in ['p', 'P', 'e', 'E'] and
-                                                                              node.name not in anchor_names)
+                subjects = [node for node in self.dep_index.find_by_role('p', 'P', 'e', 'E')
+                            if node.name not in anchor_names]
                 found = False
                 if r_node.parent is not None:
                     # pattern 1 -- sibling (before)
@@ -1251,13 +1637,13 @@ class FOLGenerator:
                     relation = PlaceDependencyTree.clone_node_without_children(r_node)
                 # pattern 4 -- not a spatial relationship but a property-preposition
                 if not found and len(subjects) == 0:
-                    r_node.role = ''
-                    location.role = ''
-                    relationship.role = ''
+                    self.dep_index.set_role(r_node, '')
+                    self.cons_index.set_role(location, '')
+                    self.cons_index.set_role(relationship, '')
                     if r_node.parent is not None and r_node.parent.role == 'o':
                         first = PlaceDependencyTree.clone_node_without_children(r_node.parent)
-                        relation = AnyNode(name=r_node.name, spans=[{}], attributes=None, link='PROPERTY',
-                                           nodeType='RELATION')
+                        relation = TreeNode(name=r_node.name, attributes=None, link='PROPERTY',
+                                            nodeType='RELATION')
                 if first is not None and relation is not None:
                     for anchor in anchors:
                         second = PlaceDependencyTree.clone_node_without_children(anchor, cons_tree=True)
@@ -1302,8 +1688,7 @@ class FOLGenerator:
                         self.dependencies['criteria'][len(self.dependencies['criteria']) - 1].extra.append(extra)
 
     def extract_property_relationships(self):
-        non_spatial_prepositions = search.findall(self.dep.root, filter_=lambda node: node.link == 'prep' and
-                                                                                      node.role == '')
+        non_spatial_prepositions = [node for node in self.dep_index.find_by_role('') if node.link == 'prep']
         for p in non_spatial_prepositions:
             first = None
             second = None
@@ -1314,25 +1699,28 @@ class FOLGenerator:
                 if child.role in ['p', 'P']:
                     second = PlaceDependencyTree.clone_node_without_children(child)
             if first is not None and second is not None:
-                relation = AnyNode(name=p.name, spans=[{}], attributes=None, link='PROPERTY',
-                                   nodeType='RELATION')
+                relation = TreeNode(name=p.name, attributes=None, link='PROPERTY',
+                                    nodeType='RELATION')
                 self.dependencies['criteria'].append(Dependency(first, relation, second))
 
 
 class PlaceDependencyTree:
     UNITS = ['meters', 'kilometers', 'miles', 'mile', 'meter', 'kilometer',
              'km', 'm', 'mi', 'yard', 'hectare']
+    STOP_WORDS = ['the', 'a', 'an']
 
     def __init__(self, dependency_dict):
         self.dict = dependency_dict
         self.root = None
         self.tree = None
+        self.index = None
         self.construct_dependencies()
         self.dependencies = []
 
     def construct_dependencies(self):
-        root = AnyNode(name=self.dict['word'], nodeType=self.dict['nodeType'],
-                       attributes=self.dict['attributes'], spans=self.dict['spans'], link=self.dict['link'], role='')
+        root = TreeNode(name=self.dict['word'], nodeType=self.dict['nodeType'], attributes=self.dict['attributes'],
+                        start=self.dict['spans'][0]['start'], end=self.dict['spans'][0]['end'],
+                        link=self.dict['link'], role='')
         if 'children' in self.dict.keys():
             for child in self.dict['children']:
                 self.add_to_tree(child, root)
@@ -1340,9 +1728,9 @@ class PlaceDependencyTree:
         self.tree = RenderTree(root)
 
     def add_to_tree(self, node, parent):
-        n = AnyNode(name=node['word'], nodeType=node['nodeType'], parent=parent,
-                    attributes=node['attributes'], spans=node['spans'],
-                    link=node['link'], role='')
+        n = TreeNode(name=node['word'], nodeType=node['nodeType'], parent=parent,
+                     attributes=node['attributes'], start=node['spans'][0]['start'], end=node['spans'][0]['end'],
+                     link=node['link'], role='')
         if 'children' in node.keys():
             for child in node['children']:
                 self.add_to_tree(child, n)
@@ -1366,20 +1754,34 @@ class PlaceDependencyTree:
             self.detect_complex_prepositions()
             self.detect_units()
 
-    def clean_d_tree(self, str_dict):
-        for k, v in str_dict.items():
-            nodes = search.findall(self.root, filter_=lambda node: node.spans[0]['start'] >= v['start'] and
-                                                                   node.spans[0]['end'] <= v[
-                                                                       'end'] + 3 and node.name.strip() ==
-                                                                   re.split('--', k.strip())[0])
+    # drops the determiners from the tree and indexes the remaining nodes by span in the same traversal
+    def index_tree(self):
+        nodes = []
+        stack = [self.root]
+        while len(stack) > 0:
+            node = stack.pop()
+            children = node.children
+            if node.parent is not None and node.name in PlaceDependencyTree.STOP_WORDS and node.nodeType == 'DT':
+                siblings = node.parent.children
+                i = siblings.index(node)
+                node.parent.children = siblings[:i] + children + siblings[i + 1:]
+            else:
+                nodes.append(node)
+            stack.extend(reversed(children))
+        self.index = SpanIndex(nodes)
+
+    # labels is a LabelSet (or a dict of labels) of the question
+    def clean_d_tree(self, labels):
+        self.index_tree()
+        for label in LabelSet(labels):
+            inside = self.index.find_inside(label.start, label.end + 3)
+            nodes = [node for node in inside if node.name.strip() == label.text]
             if len(nodes) > 0:
                 for n in nodes:
-                    n.role = v['role']
-                    n.attributes = [v['pos']]
+                    n.role = label.role
+                    n.attributes = [label.pos]
             else:
-                nodes = search.findall(self.root, filter_=lambda node: node.spans[0]['start'] >= v['start'] and
-                                                                       node.spans[0]['end'] <= v[
-                                                                           'end'] + 3 and node.name in k)
+                nodes = [node for node in inside if node.name in label.key]
                 selected = None
                 depth = 1000
                 for node in nodes:
@@ -1393,29 +1795,13 @@ class PlaceDependencyTree:
                             node.parent = None
                             for child in node.children:
                                 children.append(child)
-                    selected.name = re.split('--', k.strip())[0]
-                    selected.role = v['role']
-                    selected.attributes = [v['pos']]
+                    selected.name = label.text
+                    selected.role = label.role
+                    selected.attributes = [label.pos]
                 for child in children:
                     if child.parent is not None:
                         child.parent = selected
 
-        stop_words = search.findall(self.root, filter_=lambda node: node.name in ['the', 'a', 'an'] and
-                                                                    node.nodeType == 'DT')
-        for stop_word in stop_words:
-            if len(stop_word.children) == 0:
-                stop_word.parent = None
-            else:
-                parent = stop_word.parent
-                children = stop_word.children
-                new_children = []
-                for sibling in parent.children:
-                    if sibling == stop_word:
-                        new_children.extend(children)
-                    else:
-                        new_children.append(sibling)
-                parent.children = new_children
-
     def detect_conjunctions(self):
         conjunctions = search.findall(self.root,
                                       filter_=lambda node: ('SCONJ' in node.attributes or 'CCONJ' in node.attributes)
@@ -1427,7 +1813,7 @@ class PlaceDependencyTree:
             if 'AUX' in conj.parent.attributes or 'VERB' in conj.parent.attributes:
                 temp = search.findall(conj.parent,
                                       filter_=lambda node: node.parent == conj.parent and node.link == 'nsubj')
-                print(temp)
+                logging.debug(temp)
                 if len(temp) == 1:
                     first = PlaceDependencyTree.clone_node_without_children(temp[0])
             else:
@@ -1485,7 +1871,7 @@ class PlaceDependencyTree:
                     for child in children:
                         first = PlaceDependencyTree.clone_node_without_children(d)
                         second = PlaceDependencyTree.clone_node_without_children(child)
-                        relation = AnyNode(name='UNIT', spans=[{}], attributes=None, link='IS/ARE', nodeType='RELATION')
+                        relation = TreeNode(name='UNIT', attributes=None, link='IS/ARE', nodeType='RELATION')
                         dep = Dependency(first, relation, second)
                         self.dependencies.append(dep)
 
@@ -1497,7 +1883,7 @@ class PlaceDependencyTree:
                     dep = Dependency(first, relation, second)
                     self.dependencies.append(dep)
             else:
-                relation = AnyNode(name='ADJ', spans=[{}], attributes=None, link='IS/ARE', nodeType='RELATION')
+                relation = TreeNode(name='ADJ', attributes=None, link='IS/ARE', nodeType='RELATION')
                 dependency = None
                 if adj.parent is not None:
                     dependency = search.findall(adj.parent,
@@ -1512,7 +1898,7 @@ class PlaceDependencyTree:
                     dep = Dependency(first, relation, adj)
                     self.dependencies.append(dep)
                 else:
-                    print('error -- adjective with multiple deps ' + str(adj))
+                    logging.warning('error -- adjective with multiple deps ' + str(adj))
 
             adverbs = search.findall(adj, filter_=lambda node: node.link in ['advmod', 'dep'] and
                                                                node.parent == adj and 'ADV' in node.attributes)
@@ -1520,7 +1906,7 @@ class PlaceDependencyTree:
                 for adv in adverbs:
                     first = PlaceDependencyTree.clone_node_without_children(adj)
                     second = PlaceDependencyTree.clone_node_without_children(adv)
-                    relation = AnyNode(name='ADV', spans=[{}], attributes=None, link='IS/ARE', nodeType='RELATION')
+                    relation = TreeNode(name='ADV', attributes=None, link='IS/ARE', nodeType='RELATION')
                     dep = Dependency(first, relation, second)
                     self.dependencies.append(dep)
 
@@ -1532,7 +1918,7 @@ class PlaceDependencyTree:
                 if (noun.parent == verb and noun.link == 'dep') or (noun.parent.parent == verb and noun.link == 'pobj'):
                     first = PlaceDependencyTree.clone_node_without_children(verb)
                     second = PlaceDependencyTree.clone_node_without_children(noun)
-                    relation = AnyNode(name='OBJ', spans=[{}], attributes=None, link='HAS/RELATE', nodeType='RELATION')
+                    relation = TreeNode(name='OBJ', attributes=None, link='HAS/RELATE', nodeType='RELATION')
                     dep = Dependency(first, relation, second)
                     self.dependencies.append(dep)
 
@@ -1557,7 +1943,7 @@ class PlaceDependencyTree:
             if selected is not None:
                 first = PlaceDependencyTree.clone_node_without_children(num)
                 second = PlaceDependencyTree.clone_node_without_children(selected)
-                relation = AnyNode(name='UNIT', spans=[{}], attributes=None, link='IS/ARE', nodeType='RELATION')
+                relation = TreeNode(name='UNIT', attributes=None, link='IS/ARE', nodeType='RELATION')
                 dep = Dependency(first, relation, second)
                 self.dependencies.append(dep)
 
@@ -1567,7 +1953,7 @@ class PlaceDependencyTree:
             if 'ADV' in prep.parent.attributes and len(prep.parent.children) == 1:
                 first = PlaceDependencyTree.clone_node_without_children(prep)
                 second = PlaceDependencyTree.clone_node_without_children(prep.parent)
-                relation = AnyNode(name='PRP', spans=[{}], attributes=None, link='IS/ARE', nodeType='RELATION')
+                relation = TreeNode(name='PRP', attributes=None, link='IS/ARE', nodeType='RELATION')
                 dep = Dependency(first, relation, second)
                 self.dependencies.append(dep)
             elif 'NUM' in prep.parent.attributes and len(prep.parent.children) > 1 \
@@ -1581,7 +1967,7 @@ class PlaceDependencyTree:
                 modifiers = search.findall(prep.parent,
                                            filter_=lambda node: 'ADV' in node.attributes and len(node.children) == 0)
                 if len(modifiers) == 1:
-                    relation = AnyNode(name='PRP', spans=[{}], attributes=None, link='IS/ARE', nodeType='RELATION')
+                    relation = TreeNode(name='PRP', attributes=None, link='IS/ARE', nodeType='RELATION')
                     second = PlaceDependencyTree.clone_node_without_children(modifiers[0])
                     dep = Dependency(first, relation, second)
                     self.dependencies.append(dep)
@@ -1602,16 +1988,16 @@ class PlaceDependencyTree:
     def clone_node_without_children(node, override={}, cons_tree=False):
         if len(override) == 0:
             if cons_tree:
-                return AnyNode(name=PlaceDependencyTree.preprocess_names(node.name), spans=node.spans,
-                               attributes=[node.nodeType],
-                               link='', nodeType=node.nodeType, role=node.role)
-            return AnyNode(name=PlaceDependencyTree.preprocess_names(node.name), spans=node.spans,
-                           attributes=node.attributes,
-                           link=node.link, nodeType=node.nodeType, role=node.role)
+                return TreeNode(name=PlaceDependencyTree.preprocess_names(node.name), start=node.start, end=node.end,
+                                attributes=[node.nodeType],
+                                link='', nodeType=node.nodeType, role=node.role)
+            return TreeNode(name=PlaceDependencyTree.preprocess_names(node.name), start=node.start, end=node.end,
+                            attributes=node.attributes,
+                            link=node.link, nodeType=node.nodeType, role=node.role)
         else:
-            return AnyNode(name=PlaceDependencyTree.preprocess_names(node.name), spans=node.spans,
-                           attributes=override['attributes'],
-                           link=override['link'], nodeType=override['nodeType'], role=node.role)
+            return TreeNode(name=PlaceDependencyTree.preprocess_names(node.name), start=node.start, end=node.end,
+                            attributes=override['attributes'],
+                            link=override['link'], nodeType=override['nodeType'], role=node.role)
 
     @staticmethod
     def preprocess_names(string):
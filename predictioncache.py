@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# bump when the cached output format of any model changes, old entries then simply stop matching
+CACHE_VERSION = '1'
+
+
+# content-addressed store of model outputs in one SQLite file, shared safely by several worker processes
+class PredictionCache:
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, timeout=30.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.local = threading.local()
+        self.connection()
+
+    def connection(self):
+        # sqlite connections must not cross a fork, so every process (and thread) opens its own
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None and self.local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory != '' and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, model TEXT, value TEXT, '
+                     'size INTEGER, accessed REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions (accessed)')
+        conn.execute('CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER)')
+        conn.execute('INSERT OR IGNORE INTO usage VALUES (0, 0)')
+        conn.execute('CREATE TRIGGER IF NOT EXISTS predictions_insert AFTER INSERT ON predictions BEGIN '
+                     'UPDATE usage SET bytes = bytes + NEW.size WHERE id = 0; END')
+        conn.execute('CREATE TRIGGER IF NOT EXISTS predictions_update AFTER UPDATE OF size ON predictions BEGIN '
+                     'UPDATE usage SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END')
+        conn.execute('CREATE TRIGGER IF NOT EXISTS predictions_delete AFTER DELETE ON predictions BEGIN '
+                     'UPDATE usage SET bytes = bytes - OLD.size WHERE id = 0; END')
+        self.local.conn = conn
+        self.local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def normalize(sentence):
+        return ' '.join(sentence.split())
+
+    @staticmethod
+    def key(model, sentence):
+        string = CACHE_VERSION + '\0' + model + '\0' + PredictionCache.normalize(sentence)
+        return hashlib.sha256(string.encode('utf-8')).hexdigest()
+
+    def get(self, model, sentence):
+        return self.get_many(model, [sentence])[0]
+
+    def get_many(self, model, sentences):
+        keys = [PredictionCache.key(model, sentence) for sentence in sentences]
+        found = {}
+        conn = self.connection()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i: i + 500]
+            rows = conn.execute('SELECT key, value FROM predictions WHERE key IN ({})'
+                                .format(','.join('?' * len(chunk))), chunk).fetchall()
+            for key, value in rows:
+                found[key] = json.loads(value)
+        if len(found) > 0:
+            now = time.time()
+            conn.executemany('UPDATE predictions SET accessed = ? WHERE key = ?', [(now, k) for k in found.keys()])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return [found.get(key) for key in keys]
+
+    def put(self, model, sentence, value):
+        self.put_many(model, [sentence], [value])
+
+    def put_many(self, model, sentences, values):
+        now = time.time()
+        rows = []
+        for sentence, value in zip(sentences, values):
+            string = json.dumps(value, ensure_ascii=False)
+            rows.append((PredictionCache.key(model, sentence), model, string, len(string.encode('utf-8')), now))
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT INTO predictions (key, model, value, size, accessed) VALUES (?, ?, ?, ?, ?) '
+                             'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                             'accessed = excluded.accessed', rows)
+            self.evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    # least recently used entries go first until the store is back under 90% of max_bytes
+    def evict(self, conn):
+        total = conn.execute('SELECT bytes FROM usage WHERE id = 0').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        while total > target:
+            rows = conn.execute('SELECT key, size FROM predictions ORDER BY accessed LIMIT 256').fetchall()
+            if len(rows) == 0:
+                break
+            for key, size in rows:
+                if total <= target:
+                    break
+                conn.execute('DELETE FROM predictions WHERE key = ?', (key,))
+                total -= size
+                evicted += 1
+        logging.debug('prediction cache evicted {} entries'.format(evicted))
+
+    def clear(self):
+        self.connection().execute('DELETE FROM predictions')
+
+    def stats(self):
+        conn = self.connection()
+        entries = conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+        size = conn.execute('SELECT bytes FROM usage WHERE id = 0').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
@@ -1,3 +1,6 @@
+import logging
+
+
 class SPARQLTemplates:
     PREFIXES = '\nPREFIX geosparql: <http://www.opengis.net/ont/geosparql#>\n' \
                'PREFIX geof: <http://www.opengis.net/def/function/geosparql/>\n' \
@@ -173,7 +176,7 @@ class SPARQLGenerator:
         try:
             role = superlative.relation.role
         except:
-            print('superlative has no role...')
+            logging.warning('superlative has no role...')
         if role is not None and role == 'R':
             resolver = AdjectiveResolver(superlative.relation.name)
         else:
@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+
+import geoparser
+from ner import Embedding, ModelRegistry
+
+logging.basicConfig(level=logging.INFO)
+
+STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+          500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class TooManyQuestions(Exception):
+    pass
+
+
+# merges concurrent questions into micro-batches: a batch is closed when it has max_batch_size questions or its
+# oldest question has waited max_wait seconds. Batches run one at a time on a single model thread; once max_queue
+# questions are waiting new ones are rejected so callers can back off, and a request with more than max_queue
+# questions is refused outright as it could never be queued. A batch whose handler raises answers all its questions
+# with an error record and the loop carries on with the next batch.
+class MicroBatcher:
+    def __init__(self, handler, max_batch_size=16, max_wait=0.01, max_queue=256):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(max_queue)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.task = None
+        self.stats = {'questions': 0, 'batches': 0, 'rejected': 0, 'errors': 0}
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def submit(self, questions):
+        loop = asyncio.get_running_loop()
+        if len(questions) > self.queue.maxsize > 0:
+            self.stats['rejected'] += len(questions)
+            raise TooManyQuestions()
+        if self.queue.maxsize > 0 and self.queue.maxsize - self.queue.qsize() < len(questions):
+            self.stats['rejected'] += len(questions)
+            raise QueueFull()
+        futures = []
+        for question in questions:
+            future = loop.create_future()
+            self.queue.put_nowait((question, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            questions = [question for question, _ in batch]
+            try:
+                records = await loop.run_in_executor(self.executor, self.handler, questions)
+                if len(records) != len(batch):
+                    raise RuntimeError('handler returned {0} records for {1} questions'.format(
+                        len(records), len(batch)))
+            except Exception as e:
+                logging.exception('batch of {0} questions failed'.format(len(batch)))
+                records = [{'question': question.strip(), 'error': repr(e)} for question in questions]
+            self.stats['batches'] += 1
+            self.stats['questions'] += len(batch)
+            for (question, future), record in zip(batch, records):
+                if 'error' in record:
+                    self.stats['errors'] += 1
+                if not future.done():
+                    future.set_result(record)
+
+
+class ParserService:
+    def __init__(self, batcher, max_body=1024 * 1024):
+        self.batcher = batcher
+        self.max_body = max_body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await self.read_head(reader)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'malformed request line or header'}, close=True)
+                    break
+                if head is None:
+                    break
+                method, path, version, headers, length = head
+                if length > self.max_body:
+                    await self.respond(writer, 413, {'error': 'request body too large'}, close=True)
+                    break
+                body = await reader.readexactly(length) if length > 0 else b''
+                status, payload, extra = await self.route(method, path, body)
+                close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+                await self.respond(writer, status, payload, extra, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    # None once the client has closed the connection; raises ValueError on a malformed (or overlong) request line,
+    # header or content length
+    @staticmethod
+    async def read_head(reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, version = request_line.decode('latin-1').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, value = line.decode('latin-1').split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length < 0:
+            raise ValueError('negative content length')
+        return method, path, version, headers, length
+
+    async def route(self, method, path, body):
+        if path == '/health':
+            return 200, {'status': 'ok', 'queued': self.batcher.queue.qsize(), **self.batcher.stats}, {}
+        if path != '/parse':
+            return 404, {'error': 'unknown path ' + path}, {}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}, {}
+        try:
+            request = json.loads(body.decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError()
+            single = 'question' in request
+            questions = [request['question']] if single else request['questions']
+            if not isinstance(questions, list) or not all(isinstance(q, str) and q.strip() != '' for q in questions):
+                raise ValueError()
+        except (ValueError, KeyError):
+            return 400, {'error': 'expected {"question": str} or {"questions": [str, ...]}'}, {}
+        try:
+            records = await self.batcher.submit(questions)
+        except TooManyQuestions:
+            return 413, {'error': 'at most {0} questions per request'.format(self.batcher.queue.maxsize)}, {}
+        except QueueFull:
+            return 503, {'error': 'parser is overloaded, retry later'}, {'Retry-After': '1'}
+        if single:
+            return (500 if 'error' in records[0] else 200), records[0], {}
+        return 200, {'results': records}, {}
+
+    @staticmethod
+    async def respond(writer, status, payload, extra=None, close=False):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = 'HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\nContent-Length: {2}\r\n'.format(
+            status, STATUS[status], len(body))
+        for key, value in (extra or {}).items():
+            head += '{0}: {1}\r\n'.format(key, value)
+        if close:
+            head += 'Connection: close\r\n'
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()
+
+
+async def serve(host, port, max_batch_size, max_wait, max_queue):
+    batcher = MicroBatcher(geoparser.analyze_chunk, max_batch_size, max_wait, max_queue)
+    batcher.start()
+    server = await asyncio.start_server(ParserService(batcher).handle, host, port)
+    logging.info('parsing service listening on {0}:{1}'.format(host, port))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='HTTP service returning encodings, FOL and GeoSPARQL for questions')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--max-queue', type=int, default=256)
+    parser.add_argument('--cache', default=None, help='SQLite file caching model predictions')
+    args = parser.parse_args()
+    if args.cache is not None:
+        ModelRegistry.configure(cache=args.cache)
+    ModelRegistry.preload()
+    Embedding.load_lexicons()
+    asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_wait_ms / 1000, args.max_queue))
@@ -0,0 +1,127 @@
+import bisect
+
+
+# (start, end) of every non-overlapping literal occurrence of value in text
+def occurrences(text, value):
+    res = []
+    if value == '':
+        return res
+    start = text.find(value)
+    while start >= 0:
+        res.append((start, start + len(value)))
+        start = text.find(value, start + len(value))
+    return res
+
+
+# character spans claimed by labels, a span is refused if it lies inside one claimed before. Only the spans not
+# inside another one are kept, sorted by start; their ends then increase as well, so the last kept span starting
+# at or before a query span is the only one that can contain it, which bisect finds in O(log n).
+class SpanAllocator:
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def is_covered(self, start, end):
+        i = bisect.bisect_right(self.starts, start) - 1
+        return i >= 0 and self.ends[i] >= end
+
+    def add(self, start, end):
+        if self.is_covered(start, end):
+            return
+        # the kept spans inside the new one form a run starting at the first span that starts at or after it
+        i = bisect.bisect_left(self.starts, start)
+        j = i
+        while j < len(self.starts) and self.ends[j] <= end:
+            j += 1
+        self.starts[i: j] = [start]
+        self.ends[i: j] = [end]
+
+    # the spans a label may claim; all of them are recorded afterwards, so spans of the same label do not block
+    # each other but block every later label
+    def claim(self, spans):
+        free = [(start, end) for start, end in spans if not self.is_covered(start, end)]
+        for start, end in spans:
+            self.add(start, end)
+        return free
+
+    def __len__(self):
+        return len(self.starts)
+
+
+# a labelled piece of the question; key is the 'text--start' name the labellers and the output use
+class Label:
+    __slots__ = ('text', 'start', 'end', 'role', 'pos', 'key')
+
+    def __init__(self, text, start, end, role, pos, key=None):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.role = role
+        self.pos = pos
+        self.key = key if key is not None else text + '--' + str(start)
+
+    @staticmethod
+    def from_item(key, value):
+        return Label(key.strip().split('--')[0], value['start'], value['end'], value['role'], value['pos'], key)
+
+    def to_dict(self):
+        return {'start': self.start, 'end': self.end, 'role': self.role, 'pos': self.pos}
+
+    def __repr__(self):
+        return '{0}: {1}'.format(self.key, self.to_dict())
+
+
+# labels of one question by key, merged like dicts (a later label replaces the one with the same key in place)
+class LabelSet:
+    def __init__(self, labels=()):
+        self.labels = {}
+        self.update(labels)
+
+    def add(self, label):
+        self.labels[label.key] = label
+
+    # labels, a LabelSet or a {key: {'start', 'end', 'role', 'pos'}} dict
+    def update(self, labels):
+        if isinstance(labels, dict):
+            labels = [Label.from_item(key, value) for key, value in labels.items()]
+        for label in labels:
+            self.add(label)
+        return self
+
+    # drops every label whose text is part of the key of another label whose span contains its span (a label inside
+    # the span of another one is kept when its text is not part of it, e.g. 'counties' inside 'more than'). Sorted by
+    # start, the labels that can contain a label are the ones starting at or before it and still open at its start,
+    # so one sweep keeps those open labels and only tests the label against them
+    def clean(self):
+        ordered = sorted(self.labels.values(), key=lambda label: label.start)
+        contained = set()
+        active = []
+        i = 0
+        while i < len(ordered):
+            start = ordered[i].start
+            j = i
+            while j < len(ordered) and ordered[j].start == start:
+                j += 1
+            active = [label for label in active if label.end >= start] + ordered[i: j]
+            for label in ordered[i: j]:
+                for other in active:
+                    if other is not label and other.end >= label.end and label.text in other.key:
+                        contained.add(label.key)
+                        break
+            i = j
+        return LabelSet(label for key, label in self.labels.items() if key not in contained)
+
+    def to_dict(self):
+        return {key: label.to_dict() for key, label in self.labels.items()}
+
+    def __iter__(self):
+        return iter(list(self.labels.values()))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, key):
+        return key in self.labels
+
+    def __repr__(self):
+        return str(self.to_dict())
@@ -0,0 +1,59 @@
+import os
+
+from gazetteer import COUNTRIES, Gazetteer, TypeMatcher, name_spans, tokenize
+
+
+def test_compound_type_keeps_capitalized_type_in_name():
+    question = 'Is the Castle of Edinburgh less than 2 km away from Calton Hill?'
+    found = [text for _, _, text in TypeMatcher(['castle', 'hill']).find(question, specifics=['Edinburgh'])]
+    assert 'the Castle of Edinburgh' not in found
+    assert found == ['Castle', 'Hill']
+
+
+def test_compound_type_with_lowercase_type():
+    question = 'Where is the castle of Edinburgh?'
+    found = [text for _, _, text in TypeMatcher(['castle']).find(question, specifics=['Edinburgh'])]
+    assert found == ['the castle of Edinburgh', 'castle']
+
+
+def test_covers_counts_only_place_tags_and_toponyms():
+    gazetteer = Gazetteer()
+    gazetteer.add('Ireland')
+    words = ['Did', 'Joyce', 'leave', 'Ireland', '?']
+    place_tags = ['U-GPE', 'U-LOC']
+    assert not gazetteer.covers(words, ['O', 'U-PER', 'O', 'O', 'O'], place_tags)
+    assert gazetteer.covers(words, ['O', 'U-LOC', 'O', 'O', 'O'], place_tags)
+
+
+def names(question):
+    words = [token for token, _, _ in tokenize(question)]
+    return [' '.join(words[start: end]) for start, end in name_spans(words)]
+
+
+def test_pronoun_and_single_letters_are_not_names():
+    assert names('Where can I buy turkey in London?') == ['London']
+    assert names('Is Paris in A or B?') == ['Paris']
+
+
+def test_first_word_is_a_name_only_inside_a_capitalized_run():
+    assert names('Paris is in France') == ['France']
+    assert names('New York has how many parks?') == ['New York']
+
+
+def tags(question):
+    from ner import LexiconBackend
+    parsed = LexiconBackend(Gazetteer([os.path.join(os.path.dirname(os.path.dirname(__file__)), COUNTRIES)])).parse_batch([question])[0]
+    return {word: tag for word, tag in zip(parsed['words'], parsed['tags']) if tag != 'O'}
+
+
+def test_gazetteer_hits_keep_the_casing_of_names():
+    assert tags('Can you show us the rivers near Paris?') == {'Paris': 'U-LOC'}
+    assert tags('Where can I buy turkey in London?') == {'London': 'U-LOC'}
+    assert tags('Is the usa bigger than China?') == {'China': 'U-GPE'}
+    assert tags('Is the USA bigger than China?') == {'USA': 'U-GPE', 'China': 'U-GPE'}
+
+
+def test_short_and_everyday_variants_are_dropped():
+    assert Gazetteer.variants('virgin islands (us)') == ['virgin islands']
+    assert Gazetteer.variants('united kingdom (uk)') == ['united kingdom']
+    assert Gazetteer.variants('turkey') == []
@@ -0,0 +1,67 @@
+import base64
+import importlib
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from ner import NER, Embedding, ModelRegistry
+from predictioncache import PredictionCache
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+TAGS = {'Where': ('WRB', 'ADV'), 'is': ('VBZ', 'AUX'), 'How': ('WRB', 'ADV'), 'many': ('JJ', 'ADJ'),
+        'hospitals': ('NNS', 'NOUN'), 'are': ('VBP', 'AUX'), 'there': ('EX', 'PRON'), 'in': ('IN', 'ADP')}
+QUESTIONS = ['Where is Oxford?', 'How many hospitals are there in Oxford?']
+
+
+# flat parses standing in for the recorded predictor outputs
+def constituency(sentence):
+    return {'word': sentence, 'nodeType': 'S',
+            'children': [{'word': w, 'nodeType': TAGS.get(w, ('NNP', 'PROPN'))[0]} for w in sentence.split()]}
+
+
+def dependency(sentence):
+    words = sentence.split()
+    starts = [sum(len(w) + 1 for w in words[:i]) for i in range(len(words))]
+
+    def node(i, children=()):
+        return {'word': words[i], 'nodeType': 'dep', 'attributes': [TAGS.get(words[i], ('NNP', 'PROPN'))[1]],
+                'link': 'dep', 'spans': [{'start': starts[i], 'end': starts[i] + len(words[i])}],
+                'children': list(children)}
+
+    root = node(1, [node(i) for i in range(len(words)) if i != 1])
+    root['nodeType'] = 'root'
+    return root
+
+
+@pytest.fixture
+def geoparser(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    module = importlib.import_module('geoparser')
+    monkeypatch.setattr(NER, 'backend', NER.backend)
+    NER.configure('lexicon')
+    monkeypatch.setattr(ModelRegistry, 'offline', True)
+    monkeypatch.setattr(ModelRegistry, 'cache', PredictionCache(str(tmp_path / 'predictions.sqlite')))
+    monkeypatch.setattr(Embedding, 'activity_embs', np.eye(4, dtype=np.float32))
+    monkeypatch.setattr(Embedding, 'situation_embs', np.eye(4, dtype=np.float32)[::-1].copy())
+    for question in QUESTIONS:
+        result = module.extract_information(question, module.pt_matcher, module.et_matcher)
+        refined = module.refine_questions(question, result['toponyms'], result['place_types'])
+        n = len(refined.split())
+        embedding = {'shape': [n, 4], 'data': base64.b64encode(np.ones((n, 4), dtype=np.float32).tobytes())
+                     .decode('ascii')}
+        ModelRegistry.cache.put_many(ModelRegistry.identity('constituency'), [refined], [constituency(refined)])
+        ModelRegistry.cache.put_many(ModelRegistry.identity('dependency'), [refined], [dependency(refined)])
+        ModelRegistry.cache.put_many(ModelRegistry.identity('elmo_weights'), [refined], [embedding])
+    return module
+
+
+# stdout carries only the JSONL records, diagnostics must not end up between them
+def test_stream_writes_only_json_lines(geoparser, capsys):
+    assert geoparser.stream(QUESTIONS, sys.stdout) == len(QUESTIONS)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == len(QUESTIONS)
+    records = [json.loads(line) for line in lines]
+    assert [record['question'] for record in records] == QUESTIONS
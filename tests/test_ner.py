@@ -0,0 +1,37 @@
+import base64
+
+import numpy as np
+import pytest
+
+from ner import Embedding, ModelRegistry
+from predictioncache import PredictionCache
+
+
+@pytest.fixture
+def lexicon(tmp_path, monkeypatch):
+    monkeypatch.setattr(Embedding, 'prototype_dir', str(tmp_path / 'prototypes'))
+    monkeypatch.setattr(ModelRegistry, 'cache', None)
+    monkeypatch.setattr(ModelRegistry, 'offline', True)
+    path = tmp_path / 'verbs.txt'
+    path.write_text('cross\nflow\nrun\n', encoding='utf-8')
+    return str(path)
+
+
+def test_missing_prototypes_without_elmo_fail(lexicon):
+    with pytest.raises(FileNotFoundError, match='buildprototypes.py'):
+        Embedding.load_prototypes(lexicon)
+
+
+# prototypes embedded from a recorded cache go to prototype_dir, not next to the lexicon
+def test_prototypes_from_cache_are_written_to_prototype_dir(lexicon, tmp_path):
+    ModelRegistry.cache = PredictionCache(str(tmp_path / 'predictions.sqlite'))
+    words = Embedding.read_lexicon(lexicon)
+    vectors = [np.full((1, 4), i + 1, dtype=np.float32) for i in range(len(words))]
+    ModelRegistry.cache.put_many(ModelRegistry.identity('elmo_weights'), words,
+                                 [{'shape': [1, 4], 'data': base64.b64encode(v.tobytes()).decode('ascii')}
+                                  for v in vectors])
+    prototypes = Embedding.load_prototypes(lexicon)
+    assert prototypes.shape == (3, 4)
+    assert np.allclose(prototypes, 0.5)
+    assert not any(p.suffix in ('.npy', '.sha256') for p in tmp_path.iterdir())
+    assert len(list((tmp_path / 'prototypes').iterdir())) == 1
@@ -0,0 +1,117 @@
+import random
+
+from anytree import PreOrderIter
+
+from placequestionparsetree import PlaceDependencyTree, PlaceQuestionParseTree, TreeIndex
+
+WORDS = ['How', 'many', 'hospitals', 'are', 'there', 'in', 'Oxford', 'the', 'city', 'of', 'London', 'near', 'more',
+         'than', '2', 'km', 'and', 'largest', 'river', 'crosses', 'is', 'Which', 'border', 'within', 'north']
+TAGS = {'How': 'WRB', 'many': 'JJ', 'hospitals': 'NNS', 'are': 'VBP', 'there': 'EX', 'in': 'IN', 'Oxford': 'NNP',
+        'the': 'DT', 'city': 'NN', 'of': 'IN', 'London': 'NNP', 'near': 'IN', 'more': 'JJR', 'than': 'IN', '2': 'CD',
+        'km': 'NN', 'and': 'CC', 'largest': 'JJS', 'river': 'NN', 'crosses': 'VBZ', 'is': 'VBZ', 'Which': 'WDT',
+        'border': 'NN', 'within': 'IN', 'north': 'RB'}
+PHRASES = ['NP', 'VP', 'PP', 'S', 'SQ', 'WHNP', 'QP', 'ADJP']
+
+
+# a hierplane-like constituency parse of tokens, split at random into two or three phrases per level
+def random_parse(tokens, rng):
+    if len(tokens) == 1:
+        return {'word': tokens[0], 'nodeType': TAGS[tokens[0]]}
+    cuts = sorted(rng.sample(range(1, len(tokens)), rng.randint(2, min(3, len(tokens))) - 1))
+    parts = [tokens[a:b] for a, b in zip([0] + cuts, cuts + [len(tokens)])]
+    return {'word': ' '.join(tokens), 'nodeType': rng.choice(PHRASES),
+            'children': [random_parse(part, rng) for part in parts]}
+
+
+def labelled_tree(seed):
+    rng = random.Random(seed)
+    tokens = [rng.choice(WORDS) for _ in range(rng.randint(2, 12))]
+    tree = PlaceQuestionParseTree(random_parse(tokens, rng))
+    steps = [lambda: tree.label_role(tokens[0], '2', question_words=True),
+             lambda: tree.label_role(rng.choice(tokens), rng.choice(['P', 'p', 'o']), clean=True),
+             tree.label_tree, tree.label_qualities, tree.clean_phrases, tree.clean_tree,
+             tree.label_spatiotemporal_relationships, tree.clean_locations, tree.update]
+    for step in steps:
+        try:
+            step()
+        except Exception:
+            # random trees are not always valid questions, the index must stay current regardless
+            break
+    return tree, rng
+
+
+# the index lookups return what a pre-order scan of the tree finds, in the same order, after the labelling steps
+# have renamed, respanned, merged and moved nodes
+def test_node_index_matches_tree_scan():
+    for seed in range(300):
+        tree, rng = labelled_tree(seed)
+        nodes = list(PreOrderIter(tree.root))
+        for name in set(node.name for node in nodes):
+            assert tree.index.find_by_name(name) == [node for node in nodes if node.name == name]
+        for span in set((node.start, node.end) for node in nodes):
+            assert tree.index.find_by_span(*span) == [node for node in nodes if (node.start, node.end) == span]
+        for _ in range(10):
+            start = rng.randint(0, len(tree.text))
+            end = rng.randint(start, len(tree.text))
+            assert tree.index.find_containing(start, end) == \
+                [node for node in nodes if node.start is not None and node.start <= start and node.end >= end]
+
+
+# a TreeIndex built before the tree changes answers for the changed tree
+def test_tree_index_follows_tree_changes():
+    tree = PlaceQuestionParseTree(random_parse(['How', 'many', 'hospitals', 'are', 'in', 'Oxford'], random.Random(1)))
+    index = TreeIndex(tree.root)
+    oxford = index.find_by_name('Oxford')[0]
+    index.set_role(oxford, 'P')
+    assert index.find_by_role('P') == [oxford]
+    oxford.parent = None
+    assert index.find_by_role('P') == []
+    assert index.find_by_name('Oxford') == []
+    hospitals = index.find_by_name('hospitals')[0]
+    hospitals.name = 'clinics'
+    assert index.find_by_name('clinics') == [hospitals]
+    # respanned while detached, then attached again
+    oxford.set_span(40, 46)
+    oxford.parent = tree.root
+    assert index.find_by_role('P') == [oxford]
+    assert tree.index.find_by_span(40, 46) == [oxford]
+    assert tree.index.find_containing(41, 45) == [oxford]
+    assert oxford not in tree.index.find_containing(26, 31)
+
+
+def dependency(word, start, children=()):
+    return {'word': word, 'nodeType': 'NN', 'attributes': [], 'link': 'dep',
+            'spans': [{'start': start, 'end': start + len(word)}], 'children': list(children)}
+
+
+# the span index of a dependency tree follows a node respanned while detached
+def test_span_index_follows_detached_respan():
+    tree = PlaceDependencyTree(dependency('hospitals', 9, [dependency('How', 0), dependency('many', 4),
+                                                              dependency('Oxford', 26)]))
+    tree.index_tree()
+    how, many, oxford = tree.root.children
+    oxford.parent = None
+    oxford.set_span(4, 8)
+    assert tree.index.find_inside(0, 31) == [tree.root, how, many]
+    oxford.parent = how
+    assert tree.index.find_inside(4, 8) == [oxford, many]
+    assert tree.index.find_inside(20, 31) == []
+    many.parent = None
+    assert tree.index.find_inside(4, 8) == [oxford]
+
+
+# each occurrence of a word repeated inside a phrase has its own span
+def test_repeated_word_spans():
+    river = {'word': 'the river', 'nodeType': 'NP',
+             'children': [{'word': 'the', 'nodeType': 'DT'}, {'word': 'river', 'nodeType': 'NN'}]}
+    parse = {'word': 'Is the river north of the river ?', 'nodeType': 'SQ',
+             'children': [{'word': 'Is', 'nodeType': 'VBZ'}, river,
+                          {'word': 'north of the river', 'nodeType': 'ADVP',
+                           'children': [{'word': 'north', 'nodeType': 'RB'},
+                                        {'word': 'of the river', 'nodeType': 'PP',
+                                         'children': [{'word': 'of', 'nodeType': 'IN'}, river]}]},
+                          {'word': '?', 'nodeType': '.'}]}
+    tree = PlaceQuestionParseTree(parse)
+    rivers = [node for node in PreOrderIter(tree.root) if node.name == 'river']
+    assert [(node.start, node.end) for node in rivers] == [(7, 12), (26, 31)]
+    assert [(node.start, node.end) for node in tree.index.find_by_name('river')] == [(7, 12), (26, 31)]
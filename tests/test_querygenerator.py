@@ -0,0 +1,167 @@
+import importlib
+import json
+import os
+import re
+
+import numpy as np
+import pytest
+
+from ner import NER, Embedding
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+QUESTIONS = os.path.join(ROOT, 'data', 'datasets', 'GeoQuestion201.csv')
+# GeoSPARQL of the evaluation questions written by the string template generator of the baseline, for the parses
+# below; questions the pipeline fails on with these parses are left out
+EXPECTED = os.path.join(os.path.dirname(__file__), 'data', 'geoquestion201_sparql.json')
+
+WH = {'How': 'WRB', 'Where': 'WRB', 'When': 'WRB', 'What': 'WP', 'Which': 'WDT', 'Who': 'WP', 'how': 'WRB',
+      'where': 'WRB', 'what': 'WP', 'which': 'WDT', 'that': 'WDT'}
+VERBS = {'is', 'are', 'was', 'were', 'be', 'do', 'does', 'did', 'can', 'has', 'have', 'Is', 'Are', 'Do', 'Does',
+         'Can'}
+PREPOSITIONS = {'in', 'of', 'on', 'at', 'within', 'from', 'to', 'near', 'close', 'between', 'beside', 'by', 'since',
+                'until', 'before', 'after', 'for', 'with', 'than', 'along', 'around', 'across', 'into', 'through'}
+DETERMINERS = {'the', 'a', 'an', 'The', 'A', 'An', 'all', 'each', 'every', 'any', 'some'}
+CONJUNCTIONS = {'and', 'or', 'but', 'nor', 'both', 'either', 'neither'}
+ADJECTIVES = {'many', 'much', 'closest', 'nearest', 'largest', 'biggest', 'highest', 'longest', 'smallest', 'most',
+              'least', 'more', 'less', 'larger', 'bigger', 'higher', 'longer', 'smaller', 'far', 'best', 'popular',
+              'old', 'oldest', 'tallest', 'open', 'public', 'main', 'famous', 'cheapest'}
+COARSE = {'NN': 'NOUN', 'NNS': 'NOUN', 'NNP': 'PROPN', 'VBZ': 'AUX', 'VBP': 'AUX', 'VB': 'VERB', 'IN': 'ADP',
+          'DT': 'DET', 'JJ': 'ADJ', 'CD': 'NUM', 'WRB': 'ADV', 'WP': 'PRON', 'WDT': 'DET', 'CC': 'CCONJ', '.': 'PUNCT'}
+MODIFIERS = {'DT': 'det', 'JJ': 'amod', 'CD': 'nummod', 'WRB': 'advmod', 'WDT': 'det', 'WP': 'det'}
+
+
+def tag(word):
+    if word in WH:
+        return WH[word]
+    if word in VERBS:
+        return 'VBZ' if word.lower() in ('is', 'was', 'does', 'has') else 'VBP'
+    if word.lower() in PREPOSITIONS:
+        return 'IN'
+    if word in DETERMINERS:
+        return 'DT'
+    if word in CONJUNCTIONS:
+        return 'CC'
+    if word.lower() in ADJECTIVES:
+        return 'JJ'
+    if re.fullmatch(r'\d+(\.\d+)?', word):
+        return 'CD'
+    if not word[0].isalnum():
+        return '.'
+    if word.endswith('ing') or word.endswith('ed'):
+        return 'VB'
+    if word[0].isupper():
+        return 'NNP'
+    return 'NNS' if word.endswith('s') else 'NN'
+
+
+# the question in the parsers' tokenization and its chunks: the question word phrase, verbs, noun phrases and
+# prepositional phrases (the prepositions and the noun phrase after them), as [kind, token indices]
+def chunk(question):
+    tokens = re.findall(r"[\w-]+|[^\w\s]", question)
+    tags = [tag(t) for t in tokens]
+    chunks = []
+    for i, pos in enumerate(tags):
+        kind = 'PP' if pos == 'IN' else 'VP' if pos.startswith('VB') else '.' if pos == '.' else \
+            'CC' if pos == 'CC' else 'WH' if pos.startswith('W') and i == 0 else 'NP'
+        if len(chunks) > 0 and ((kind == 'NP' and chunks[-1][0] in ('NP', 'PP', 'WH')) or
+                                (kind == 'PP' and chunks[-1][0] == 'PP' and len(chunks[-1][1]) == 1)):
+            chunks[-1][1].append(i)
+        else:
+            chunks.append([kind, [i]])
+    return tokens, tags, chunks
+
+
+# shallow stand-ins for the recorded constituency and dependency parses
+def constituency(question):
+    tokens, tags, chunks = chunk(question)
+
+    def leaf(i):
+        return {'word': tokens[i], 'nodeType': tags[i]}
+
+    def phrase(node_type, indices):
+        return {'word': ' '.join(tokens[i] for i in indices), 'nodeType': node_type,
+                'children': [leaf(i) for i in indices]}
+
+    children = []
+    for kind, indices in chunks:
+        if kind == 'PP':
+            prepositions = [i for i in indices if tags[i] == 'IN']
+            rest = [i for i in indices if tags[i] != 'IN']
+            node = phrase('PP', prepositions) if len(prepositions) > 1 else leaf(prepositions[0])
+            node = {'word': ' '.join(tokens[i] for i in indices), 'nodeType': 'PP',
+                    'children': [node] + ([phrase('NP', rest)] if len(rest) > 0 else [])}
+        elif kind == 'WH':
+            node = phrase('WHNP', indices)
+        elif kind in ('NP', 'VP') and len(indices) > 1:
+            node = phrase(kind, indices)
+        else:
+            node = leaf(indices[0])
+        children.append(node)
+    return {'word': ' '.join(tokens), 'nodeType': 'SBARQ', 'children': children}
+
+
+def dependency(question):
+    tokens, tags, chunks = chunk(question)
+    starts = [sum(len(t) + 1 for t in tokens[:i]) for i in range(len(tokens))]
+    nodes = [{'word': t, 'nodeType': '', 'attributes': [COARSE[p]], 'link': '',
+              'spans': [{'start': s, 'end': s + len(t)}], 'children': []} for t, p, s in zip(tokens, tags, starts)]
+
+    def attach(i, head, link):
+        nodes[i]['nodeType'] = nodes[i]['link'] = link
+        nodes[head]['children'].append(nodes[i])
+
+    verbs = [i for i, pos in enumerate(tags) if pos.startswith('VB')]
+    root = verbs[0] if len(verbs) > 0 else 0
+    previous = root
+    for kind, indices in chunks:
+        nouns = [i for i in indices if tags[i].startswith('N') or tags[i] == 'CD']
+        head = nouns[-1] if len(nouns) > 0 else indices[-1]
+        if kind == 'PP':
+            preposition = indices[0]
+            if preposition != root:
+                attach(preposition, previous, 'prep')
+            for i in indices[1:]:
+                if tags[i] == 'IN':
+                    attach(i, preposition, 'prep')
+            if head != preposition and tags[head] != 'IN':
+                attach(head, preposition, 'pobj')
+        elif head != root:
+            link = {'WH': 'advmod', 'CC': 'cc', '.': 'punct'}.get(kind, 'nsubj' if previous == root else 'conj')
+            attach(head, root, link)
+        for i in indices:
+            if i not in (head, root) and nodes[i]['link'] == '':
+                attach(i, head, MODIFIERS.get(tags[i], 'compound'))
+        if kind not in ('.', 'CC', 'VP'):
+            previous = head
+    nodes[root]['nodeType'] = nodes[root]['link'] = 'root'
+    return nodes[root]
+
+
+@pytest.fixture
+def geoparser(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    module = importlib.import_module('geoparser')
+    monkeypatch.setattr(NER, 'backend', NER.backend)
+    NER.configure('lexicon')
+    monkeypatch.setattr(Embedding, 'activity_embs', np.eye(4, dtype=np.float32))
+    monkeypatch.setattr(Embedding, 'situation_embs', np.eye(4, dtype=np.float32)[::-1].copy())
+    return module
+
+
+def geosparql(geoparser, question):
+    result = geoparser.extract_information(question, geoparser.pt_matcher, geoparser.et_matcher)
+    refined = geoparser.refine_questions(question, result['toponyms'], result['place_types'])
+    c_parse = constituency(refined)
+    embeddings = np.ones((len(c_parse['word'].split()), 4), dtype=np.float32)
+    return geoparser.parse_question(question, result=result, c_parse=c_parse, d_parse=dependency(refined),
+                                    c_embeddings=embeddings)['geosparql']
+
+
+def test_evaluation_questions_give_the_baseline_geosparql(geoparser):
+    with open(QUESTIONS, encoding='utf-8-sig') as f:
+        questions = [line.strip() for line in f if line.strip() != '']
+    with open(EXPECTED, encoding='utf-8') as f:
+        expected = json.load(f)
+    assert set(expected) <= set(questions) and len(expected) > 180
+    for question, query in expected.items():
+        assert geosparql(geoparser, question) == query, question
@@ -0,0 +1,17 @@
+from spans import LabelSet
+
+
+def test_clean_keeps_label_inside_span_of_unrelated_label():
+    # 'Does England have more counties than Ireland?'
+    info = {'England--5': {'start': 5, 'end': 12, 'role': 'P', 'pos': 'NNP'},
+            'more than--18': {'start': 18, 'end': 36, 'role': 'q', 'pos': 'JJR'},
+            'counties--23': {'start': 23, 'end': 31, 'role': 't', 'pos': 'NNS'},
+            'Ireland--37': {'start': 37, 'end': 44, 'role': 'P', 'pos': 'NNP'}}
+    assert LabelSet(info).clean().to_dict() == info
+
+
+def test_clean_drops_label_inside_text_and_span_of_another():
+    info = {'Edinburgh Castle--10': {'start': 10, 'end': 26, 'role': 'P', 'pos': 'NNP'},
+            'Edinburgh--10': {'start': 10, 'end': 19, 'role': 'P', 'pos': 'NNP'},
+            'Castle--20': {'start': 20, 'end': 26, 'role': 't', 'pos': 'NN'}}
+    assert list(LabelSet(info).clean().to_dict()) == ['Edinburgh Castle--10']